@@ -0,0 +1,98 @@
+__all__ = ['AGGREGATEMODES', 'normalizeColumns', 'aggregateRatings']
+
+import array
+import itertools
+import math
+
+
+_NORATING = float('nan')
+
+AGGREGATEMODES = ('first', 'average', 'median', 'trimmed')
+
+
+def meanStd(values):
+  count = len(values)
+  mean = math.fsum(values) / count
+  return mean, math.sqrt(math.fsum((value - mean) ** 2 for value in values) / count)
+
+
+# Maps each column onto the scale of all ratings pooled together: a rating becomes a z-score
+# within its own list and then a rating with the same z-score in the pool. NaN stays NaN.
+def normalizeColumns(columns):
+  pooled = [rating for column in columns for rating in column if rating == rating]
+  if len(pooled) < 2:
+    return columns
+  pmean, pstd = meanStd(pooled)
+  result = []
+  for column in columns:
+    rated = [rating for rating in column if rating == rating]
+    mean, std = meanStd(rated) if len(rated) > 1 else (0.0, 0.0)
+    if std == 0.0:
+      result.append(column)
+      continue
+    scale = pstd / std
+    result.append(array.array('d', (pmean + (rating - mean) * scale for rating in column)))
+  return result
+
+
+def _average(values, weights):
+  return sum(weight * value for value,weight in zip(values, weights)) / sum(weights)
+
+
+# Weighted median. With equal weights and an even count it is the mean of the two middle values.
+def _median(values, weights):
+  pairs = sorted(zip(values, weights))
+  half = sum(weights) / 2
+  acc = 0.0
+  for idx,(value,weight) in enumerate(pairs):
+    acc += weight
+    if acc > half:
+      return value
+    if acc == half:
+      return (value + pairs[idx + 1][0]) / 2
+
+
+def _trimmed(values, weights, trim):
+  count = len(values)
+  cut = min(int(count * trim), (count - 1) // 2)
+  pairs = sorted(zip(values, weights))[cut:count - cut]
+  return sum(weight * value for value,weight in pairs) / sum(weight for _,weight in pairs)
+
+
+# Combines equally long or shorter rating columns (NaN meaning not rated) into one rating per
+# row. Returns the ratings and, for each row, a tuple of the column indexes that rated it or None.
+# Columns with a weight of 0 are ignored.
+def aggregateRatings(columns, weights, mode = 'average', trim = 0.25):
+  if mode not in AGGREGATEMODES:
+    raise ValueError('Unknown aggregation mode: {0}'.format(mode))
+  ratings = array.array('d')
+  sourceids = []
+  used = tuple(idx for idx,weight in enumerate(weights) if weight > 0)
+  uniform = len(set(weights[idx] for idx in used)) <= 1
+  shared = {}
+  for row in itertools.zip_longest(*(columns[idx] for idx in used), fillvalue = _NORATING):
+    positions = [pos for pos,rating in enumerate(row) if rating == rating]
+    if not positions:
+      ratings.append(_NORATING)
+      sourceids.append(None)
+      continue
+    if mode == 'first':
+      positions = positions[:1]
+    ids = tuple(used[pos] for pos in positions)
+    ids = shared.setdefault(ids, ids)
+    values = [row[pos] for pos in positions]
+    if mode == 'first' or len(ids) == 1:
+      rating = values[0]
+    else:
+      rweights = [weights[idx] for idx in ids]
+      if mode == 'average' and uniform:
+        rating = sum(values) / len(values)
+      elif mode == 'average':
+        rating = _average(values, rweights)
+      elif mode == 'median':
+        rating = _median(values, rweights)
+      else:
+        rating = _trimmed(values, rweights, trim)
+    ratings.append(rating)
+    sourceids.append(ids)
+  return ratings, sourceids
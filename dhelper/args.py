@@ -1,26 +1,71 @@
-__all__ = ['parseArgs']
+__all__ = ['getParser', 'parseArgs']
 
+import os
 import sys
 import argparse
 import textwrap
 
 from .filter import FILTERHELP
 from .config import CFG
+from .records import RECORDFORMATS
+
+
+# Built once per loaded config: defaults come from the config, which is loaded before the first
+# call. Loading it again (bench does, for its fixtures) gives a new parser with the new defaults.
+_PARSER = []
+def getParser():
+  if not _PARSER or _PARSER[0][0] is not CFG.pcfg:
+    _PARSER[:] = [(CFG.pcfg, mkParser())]
+  return _PARSER[0][1]
 
 
 def parseArgs(args = None):
-  cfg = CFG
   if args is None:
     args = sys.argv[1:]
+  if len(args) == 0:
+    args = ['interact']
+  return getParser().parse_args(args)
+
+
+# Argument type for counts that must be at least 1.
+def positiveInt(value):
+  number = int(value)
+  if number < 1:
+    raise argparse.ArgumentTypeError('must be at least 1: {0}'.format(value))
+  return number
+
+
+def addFormatArgument(parser):
+  parser.add_argument('-F', '--format', choices = ('text',) + RECORDFORMATS, default = 'text',
+    help = 'Output format (default text). The others write one record per card, stats summary or\n'
+      'color combination to stdout, with a "record" field telling them apart. Messages go to stderr.')
+
+
+def mkParser():
+  cfg = CFG
   parser = argparse.ArgumentParser()
+  # Without a subcommand (for example just --timings) run interactive mode.
+  parser.set_defaults(mode = 'interact')
+  parser.add_argument('--timings', action = 'store_true',
+    default = os.environ.get('DHELPER_TIMINGS', '') not in ('', '0'),
+    help = 'Report the time spent per stage to stderr (env DHELPER_TIMINGS=1)')
+  parser.add_argument('--trace', metavar = '<FILENAME>', type = str,
+    default = os.environ.get('DHELPER_TRACE') or None,
+    help = 'Save the stage timings as JSON, loadable in chrome://tracing or Perfetto (env DHELPER_TRACE)')
+  parser.add_argument('--tracemalloc', action = 'store_true',
+    default = os.environ.get('DHELPER_TRACEMALLOC', '') not in ('', '0'),
+    help = 'Also track memory allocated per stage with tracemalloc, slow (env DHELPER_TRACEMALLOC=1)')
+  parser.add_argument('--profile', metavar = '<FILENAME>', type = str,
+    default = os.environ.get('DHELPER_PROFILE') or None,
+    help = 'Save cProfile statistics, view with: python -m pstats <FILENAME> (env DHELPER_PROFILE)')
   subparsers = parser.add_subparsers(help = 'Use <SUBCOMMAND> --help for subcommand specific help')
 
   deck_parser = subparsers.add_parser('deck', aliases = ['d'], help = 'Deck mode',
     formatter_class = argparse.RawTextHelpFormatter)
   deck_parser.add_argument(action = 'store_const', dest = 'mode', const = 'deck', help = argparse.SUPPRESS)
-  deck_parser.add_argument('-d', '--deck', metavar = '<DECKNAME>', type = str,
-    default = cfg.modes.deck.deck,
-    help = 'Deck file, exported from Eternal (default deck.csv)')
+  deck_parser.add_argument('-d', '--deck', metavar = '<DECKNAME>', type = str, nargs = '+',
+    default = [cfg.modes.deck.deck],
+    help = 'Deck files, exported from Eternal, or - for stdin. Several exports are read as one pool (default deck.csv)')
   deck_parser.add_argument('-w', '--write', metavar = '<FILENAME>', type = str,
     default = None,
     help = 'Save the filtered cards in Eternal deck format')
@@ -29,9 +74,11 @@ def parseArgs(args = None):
     help = textwrap.dedent(FILTERHELP))
   dmegroup.add_argument('-c', '--cost', action = 'store_true', default = False,
     help = 'Group by cost (mutually exclusive with --filter)')
+  addFormatArgument(deck_parser)
 
   draft_parser = subparsers.add_parser('draft', aliases = ['r'], help = 'Draft mode')
   draft_parser.add_argument(action = 'store_const', dest = 'mode', const = 'draft', help = argparse.SUPPRESS)
+  addFormatArgument(draft_parser)
 
   interact_parser = subparsers.add_parser('interact', aliases = ['i'], help = 'Interactive mode')
   interact_parser.add_argument(action = 'store_const', dest = 'mode', const = 'interact', help = argparse.SUPPRESS)
@@ -40,8 +87,8 @@ def parseArgs(args = None):
   quarry_parser = subparsers.add_parser('quarry', aliases = ['q'], help = 'Quarry mode (deck analysis)',
     formatter_class = argparse.RawTextHelpFormatter)
   quarry_parser.add_argument(action = 'store_const', dest = 'mode', const = 'quarry', help = argparse.SUPPRESS)
-  quarry_parser.add_argument('-d', '--deck', metavar = '<DECKNAME>', type = str, default = qcfg.deck,
-    help = 'Deck file, exported from Eternal (default deck.csv)')
+  quarry_parser.add_argument('-d', '--deck', metavar = '<DECKNAME>', type = str, nargs = '+', default = [qcfg.deck],
+    help = 'Deck files, exported from Eternal, or - for stdin. Several exports are read as one pool (default deck.csv)')
   qminunits = qcfg.minunits
   quarry_parser.add_argument('-u', '--units', metavar = '<NUM>', type = int,
     default = qminunits,
@@ -67,6 +114,119 @@ def parseArgs(args = None):
     help = textwrap.dedent('NOTE: Specifying color filters will likely cause issues here.\n' + FILTERHELP))
   quarry_parser.add_argument('-w', '--write', action = 'store_true', default = False,
     help = 'Will write matching colors in deck format to <inputfile>.<COLOR>.lst. For example if the input was event.lst, it might create event.lst.TJP.lst.')
+  quarry_parser.add_argument('-o', '--optimize', action = 'store_true', default = False,
+    help = 'Build the best rated deck for each color combination. With --expand or --cost the deck is shown\ninstead of all the cards and --write writes the deck including sigils.')
+  quarry_parser.add_argument('-I', '--influence', action = 'store_true', default = False,
+    help = 'With --optimize, show how often the deck has the influence for its cards on curve and\nthe sigils that would do best.')
+  quarry_parser.add_argument('-D', '--decksize', metavar = '<NUM>', type = int, default = qcfg.decksize,
+    help = 'Deck size for --optimize (default {0}).'.format(qcfg.decksize))
+  addFormatArgument(quarry_parser)
+
+  inf_parser = subparsers.add_parser('influence', aliases = ['inf'],
+    help = 'Odds of having the influence for each card on curve, and sigil counts that improve them',
+    formatter_class = argparse.RawTextHelpFormatter)
+  inf_parser.add_argument(action = 'store_const', dest = 'mode', const = 'influence', help = argparse.SUPPRESS)
+  inf_parser.add_argument('-d', '--deck', metavar = '<DECKNAME>', type = str, nargs = '+', default = [cfg.modes.deck.deck],
+    help = 'Deck files, exported from Eternal, or - for stdin. Several exports are read as one deck (default deck.csv)')
+  inf_parser.add_argument('-s', '--sigils', metavar = '<SIGILS>', type = str, nargs = '+', default = None,
+    help = 'Sigils to use instead of the deck\'s, as counts and colors like 8F 7T.')
+  inf_parser.add_argument('-S', '--suggest', metavar = '<NUM>', type = int, nargs = '*', default = None,
+    help = 'Suggest sigils for the deck\'s colors at these power counts (default {0} to {1}).'.format(
+      qcfg.minpower, qcfg.maxpower))
+  inf_parser.add_argument('-t', '--turns', metavar = '<NUM>', type = int, default = 0,
+    help = 'Also show the odds for each influence requirement on turns 1 to <NUM>.')
+  inf_parser.add_argument('--draw', action = 'store_true', default = False,
+    help = 'Odds for going second, with one more card drawn.')
+  addFormatArgument(inf_parser)
+
+  qb_parser = subparsers.add_parser('quarry-batch', aliases = ['qb'],
+    help = 'Quarry mode for many pools at once, with CSV or JSON lines output',
+    formatter_class = argparse.RawTextHelpFormatter)
+  qb_parser.add_argument(action = 'store_const', dest = 'mode', const = 'quarry-batch', help = argparse.SUPPRESS)
+  qb_parser.set_defaults(plain = True)
+  qb_parser.add_argument('pools', metavar = '<POOL>', nargs = '+',
+    help = 'Pool files exported from Eternal, directories of .lst files or glob patterns like "event/*.lst".')
+  qb_parser.add_argument('-u', '--units', metavar = '<NUM>', type = int,
+    default = qminunits,
+    help = 'Minimum units allowed (default {0}).'.format(qminunits))
+  qb_parser.add_argument('-m', '--maxcolors', metavar = '<NUM>', type = int,
+    default = qmaxcolors,
+    help = 'Maximum colors allowed (default {0}).'.format(qmaxcolors))
+  qb_parser.add_argument('-p', '--playable', metavar = '<NUM>', type = int,
+    default = qminplayable,
+    help = 'Minimum playable cards allowed (default {0}).'.format(qminplayable))
+  qb_parser.add_argument('-U', '--unknownscore', metavar = '<FLOAT>', type = float, default = None,
+    help = 'Rating to assign to cards not in tierlist otherwise they are skipped.')
+  qb_parser.add_argument('-f', '--filter', metavar = '<FILTER>', type = str, default = None,
+    help = textwrap.dedent('NOTE: Specifying color filters will likely cause issues here.\n' + FILTERHELP))
+  qb_parser.add_argument('-o', '--output', metavar = '<FILENAME>', type = str, default = '-',
+    help = 'Output file, "-" for standard output (default -).')
+  qb_parser.add_argument('-F', '--format', choices = ('csv', 'jsonl'), default = 'csv',
+    help = 'Output format, one row per pool and color combination (default csv).')
+  qb_parser.add_argument('-j', '--jobs', metavar = '<NUM>', type = int, default = None,
+    help = 'Number of worker processes (default: one per CPU).')
+
+  sim_parser = subparsers.add_parser('simulate', aliases = ['sim'],
+    help = 'Simulate drafts between bots with different pick strategies and compare their decks')
+  sim_parser.add_argument(action = 'store_const', dest = 'mode', const = 'simulate', help = argparse.SUPPRESS)
+  sim_parser.add_argument('-n', '--drafts', metavar = '<NUM>', type = positiveInt, default = 100,
+    help = 'Number of drafts (default 100).')
+  sim_parser.add_argument('-s', '--seed', metavar = '<NUM>', type = int, default = 0,
+    help = 'Random seed, the same seed gives the same results (default 0).')
+  sim_parser.add_argument('-S', '--strategies', metavar = '<STRATEGY>', nargs = '+', default = ['rating', 'committed'],
+    choices = ('rating', 'committed', 'random'),
+    help = 'Pick strategies, assigned to seats in turn: rating, committed or random (default rating committed).')
+  sim_parser.add_argument('-P', '--players', metavar = '<NUM>', type = positiveInt, default = 8,
+    help = 'Drafters per draft (default 8).')
+  sim_parser.add_argument('--packs', metavar = '<NUM>', type = positiveInt, default = 4,
+    help = 'Packs per drafter (default 4).')
+  sim_parser.add_argument('--set', metavar = '<SETID>', dest = 'sets', nargs = '+', default = None,
+    help = 'Only put cards from these sets in packs.')
+  sim_parser.add_argument('-m', '--maxcolors', metavar = '<NUM>', type = int, default = 2,
+    help = 'Maximum colors of the decks built from the picks (default 2).')
+  sim_parser.add_argument('-u', '--units', metavar = '<NUM>', type = int, default = qminunits,
+    help = 'Minimum units in the decks built from the picks (default {0}).'.format(qminunits))
+  sim_parser.add_argument('-U', '--unknownscore', metavar = '<FLOAT>', type = float, default = None,
+    help = 'Rating to assign to cards not in tierlist otherwise they are skipped.')
+  sim_parser.add_argument('-j', '--jobs', metavar = '<NUM>', type = int, default = None,
+    help = 'Number of worker processes (default: one per CPU).')
+
+  bench_parser = subparsers.add_parser('bench',
+    help = 'Time loading, filtering, quarry and rendering on generated fixtures, with JSON output')
+  bench_parser.add_argument(action = 'store_const', dest = 'mode', const = 'bench', help = argparse.SUPPRESS)
+  bench_parser.set_defaults(plain = True)
+  bench_parser.add_argument('-n', '--cards', metavar = '<NUM>', type = int, default = 10000,
+    help = 'Cards in the generated database (default 10000).')
+  bench_parser.add_argument('-p', '--pools', metavar = '<NUM>', type = int, nargs = '+', default = [45, 500],
+    help = 'Sizes of the generated pools (default 45 500).')
+  bench_parser.add_argument('-r', '--repeat', metavar = '<NUM>', type = int, default = 5,
+    help = 'Runs of each benchmark, min and median are reported (default 5).')
+  bench_parser.add_argument('-s', '--seed', metavar = '<NUM>', type = int, default = 0,
+    help = 'Random seed for the fixtures (default 0).')
+  bench_parser.add_argument('--dir', metavar = '<DIRECTORY>', type = str, default = None,
+    help = 'Write the fixtures here and keep them (default: a temporary directory).')
+  bench_parser.add_argument('-o', '--output', metavar = '<FILENAME>', type = str, default = '-',
+    help = 'Output file, "-" for standard output (default -).')
+
+  scfg = cfg.server
+  serve_parser = subparsers.add_parser('serve',
+    help = 'Keep the card database loaded and answer queries over HTTP on localhost')
+  serve_parser.add_argument(action = 'store_const', dest = 'mode', const = 'serve', help = argparse.SUPPRESS)
+  serve_parser.add_argument('-H', '--host', metavar = '<HOST>', type = str, default = scfg.host,
+    help = 'Address to listen on (default {0}).'.format(scfg.host))
+  serve_parser.add_argument('-P', '--port', metavar = '<PORT>', type = int, default = scfg.port,
+    help = 'Port to listen on (default {0}).'.format(scfg.port))
+
+  client_parser = subparsers.add_parser('client', aliases = ['c'],
+    help = 'Run a deck, quarry or dumptierlist command on a running server. Example: client quarry -d pool.lst')
+  client_parser.add_argument(action = 'store_const', dest = 'mode', const = 'client', help = argparse.SUPPRESS)
+  client_parser.set_defaults(plain = True)
+  client_parser.add_argument('-H', '--host', metavar = '<HOST>', type = str, default = scfg.host,
+    help = 'Server address (default {0}).'.format(scfg.host))
+  client_parser.add_argument('-P', '--port', metavar = '<PORT>', type = int, default = scfg.port,
+    help = 'Server port (default {0}).'.format(scfg.port))
+  client_parser.add_argument('args', metavar = '<COMMAND>', nargs = argparse.REMAINDER,
+    help = 'The command and its arguments.')
 
   update_parser = subparsers.add_parser('update', aliases = ['u'],
     help = 'Force update of cards.csv and tierlists')
@@ -81,8 +241,7 @@ def parseArgs(args = None):
   dumptl_parser = subparsers.add_parser('dumptierlist',
     help = 'Dump the tierlist value for each known card to the terminal in CSV format')
   dumptl_parser.add_argument(action = 'store_const', dest = 'mode', const = 'dumptierlist')
+  dumptl_parser.add_argument('--set', metavar = '<SETID>', dest = 'sets', nargs = '+', default = None,
+    help = 'Only cards from these sets, best rated first.')
 
-  argslen = len(args)
-  if argslen == 0:
-    args = ['interact']
-  return parser.parse_args(args)
+  return parser
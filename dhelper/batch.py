@@ -0,0 +1,81 @@
+__all__ = ['BATCHFIELDS', 'expandPools', 'quarryPool', 'quarryPools']
+
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+
+from .config import loadConfig
+from .deck import loadDeckCards
+from .filter import Filter
+from .lists import loadRatedCards
+from .quarry import QuarryEngine
+
+
+BATCHFIELDS = ('pool', 'colors', 'rank', 'avgscore', 'totalscore', 'known', 'unknown',
+  'units', 'spells', 'fastspells', 'attachments', 'power', 'curve', 'playable')
+
+# The card database for this process. Forked workers inherit the parent's copy, others load the snapshot.
+_CARDS = None
+
+
+def _initWorker():
+  global _CARDS
+  if _CARDS is None:
+    loadConfig()
+    _CARDS = loadRatedCards()
+
+
+def expandPools(patterns):
+  result = []
+  for pattern in patterns:
+    matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+    for fn in matches:
+      if os.path.isdir(fn):
+        result += sorted(os.path.join(fn, dfn) for dfn in os.listdir(fn) if dfn.endswith('.lst'))
+      else:
+        result.append(fn)
+  return result
+
+
+# Returns (fn, rows, warnings) for a single pool. Problems are reported as warnings rather than raised so
+# one bad file cannot take down a whole batch.
+def quarryPool(fn, maxcolors, minunits, minplayable, filterstr = None, unknownscore = None, cards = None):
+  if cards is None:
+    cards = _CARDS
+  warnings = []
+  warn = lambda *args: warnings.append(' '.join(str(arg) for arg in args))
+  try:
+    deckcards = loadDeckCards(fn, cards, warn = warn)
+  except (IOError, OSError, UnicodeDecodeError) as err:
+    warn('!! Could not load pool:', err)
+    return fn, [], warnings
+  engine = QuarryEngine(deckcards, Filter.fromString(filterstr) if filterstr else None,
+    unknownscore = unknownscore)
+  rows = [dict(pool = fn, **row)
+    for row in engine.rows(maxcolors = maxcolors, minunits = minunits, minplayable = minplayable)]
+  return fn, rows, warnings
+
+
+def _quarryPoolArgs(args):
+  return quarryPool(*args)
+
+
+# Yields quarryPool results in input order while the pools are scored across worker processes.
+def quarryPools(cards, fns, maxcolors, minunits, minplayable, filterstr = None, unknownscore = None, jobs = None):
+  global _CARDS
+  _CARDS = cards
+  argslist = [(fn, maxcolors, minunits, minplayable, filterstr, unknownscore) for fn in fns]
+  if jobs is None:
+    jobs = os.cpu_count() or 1
+  jobs = max(1, min(jobs, len(fns)))
+  if jobs == 1:
+    yield from map(_quarryPoolArgs, argslist)
+    return
+  if 'fork' in multiprocessing.get_all_start_methods():
+    mpcontext = multiprocessing.get_context('fork')
+  else:
+    mpcontext = None
+  with concurrent.futures.ProcessPoolExecutor(max_workers = jobs, mp_context = mpcontext,
+      initializer = _initWorker) as executor:
+    yield from executor.map(_quarryPoolArgs, argslist, chunksize = max(1, len(fns) // (jobs * 8)))
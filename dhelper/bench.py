@@ -0,0 +1,233 @@
+__all__ = ['makeFixtures', 'runBench']
+
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+from .config import loadConfig
+from .cards import loadCards
+from .deck import loadDeckCards
+from .filter import Filter, FilteredDeck
+from .output import showRatingList
+from .stats import Stats
+from .tierlists import RatedCard, RatedCards, loadTierLists
+
+
+_FACTIONS = ('Fire', 'Time', 'Justice', 'Primal', 'Shadow', 'Neutral', 'Praxis', 'Rakano', 'Combrei', 'Feln', 'Multi')
+_SINGLE = ('Fire', 'Time', 'Justice', 'Primal', 'Shadow')
+_TYPES = (('Unit', ''), ('Unit', ''), ('Unit', ''), ('Spell', ''), ('Spell', 'Fast'), ('Attachment', ''),
+  ('Power', ''), ('Power', 'Sigil'))
+_WORDS = ('Amber Blade Crown Dawn Ember Fang Ghost Harbor Iron Jade Knight Lantern Mystic Night Oracle '
+  'Plume Quarry Raven Storm Tide Umbral Vale Warden Xeno Yearling Zeal').split()
+
+_FIXTURECONFIG = """
+[general]
+autoupdate = off
+snapshot = off
+
+[cards]
+source = local
+
+[cardids]
+source = local
+
+[tierlists]
+use = simple sunyveil konan json
+mode = average
+
+[simple]
+source = local
+filename = tl_simple.csv
+format = simple
+namecolumn = 1
+ratingcolumn = 3
+
+[sunyveil]
+source = local
+filename = tl_sunyveil.csv
+format = sunyveil
+ratingconversion = 5.0 4.0 3.0 2.0 1.0 0.5
+
+[konan]
+source = local
+filename = tl_konan.csv
+format = konan
+ratingconversion = S=5.0 A+=4.5 A=4.0 A-=3.5 B+=3.4 B=3.0 B-=2.8 C+=2.6 C=2.5 C-=2.2 D+=2.0 D=1.8 D-=1.5 F=0.5
+
+[json]
+source = local
+filename = tl_json.json
+format = json
+"""
+
+# Filters timed against every pool.
+BENCHFILTERS = ('', 'c.nFT', 'r3', 'p2,5:c+tj,f', 'r2.5:p5:c=F,TJ')
+
+
+# Unique card names from 4 words each, good for up to 26 ** 4 cards.
+def _cardName(idx):
+  words = []
+  for _ in range(4):
+    idx, digit = divmod(idx, len(_WORDS))
+    words.append(_WORDS[digit])
+  return ' '.join(reversed(words))
+
+
+# Writes a card database, card ids, a tier list in each built in format, a config using them and
+# one pool per size to dirname. Returns the pool file names.
+def makeFixtures(dirname, ncards, poolsizes, seed = 0):
+  rng = random.Random(seed)
+  names = [_cardName(idx) for idx in range(ncards)]
+  ids = {}
+  with open(os.path.join(dirname, 'cards.csv'), 'w', encoding = 'utf-8', newline = '') as fp:
+    cw = csv.writer(fp)
+    cw.writerow(('Reg', 'Prem', 'Set', 'Faction', 'Type', 'Subtype', 'Name', 'Rarity', 'Cost',
+      'C1', 'C2', 'C3', 'C4', 'C5', 'Dam', 'Life', 'Text', 'Rel', 'Upd'))
+    for idx, name in enumerate(names):
+      fac = rng.choice(_FACTIONS)
+      typ, styp = rng.choice(_TYPES)
+      influence = [''] * 5
+      if fac in _SINGLE:
+        influence[0] = str(rng.randint(1, 3))
+      elif fac not in ('Neutral', 'Multi'):
+        influence[:2] = ['1', '1']
+      stats = [str(rng.randint(1, 5)), str(rng.randint(1, 5))] if typ == 'Unit' else ['', '']
+      cw.writerow(['1', '1', 'S', fac, typ, styp, name, rng.choice('CCCCUUURL'),
+        '0' if typ == 'Power' else str(rng.randint(0, 8))] + influence + stats + ['Text of ' + name, '', ''])
+      ids[name] = (rng.randint(1, 5), idx + 1)
+  with open(os.path.join(dirname, 'cardids.csv'), 'w', encoding = 'utf-8', newline = '') as fp:
+    csv.writer(fp, quoting = csv.QUOTE_NONNUMERIC).writerows((setid, cardid, name) for name,(setid,cardid) in ids.items())
+  with open(os.path.join(dirname, 'tl_simple.csv'), 'w', encoding = 'utf-8', newline = '') as fp:
+    cw = csv.writer(fp)
+    cw.writerow(('Card', 'Notes', 'Rating'))
+    cw.writerows((name, '', round(rng.uniform(0.5, 4.5), 1)) for name in names if rng.random() < 0.8)
+  with open(os.path.join(dirname, 'tl_sunyveil.csv'), 'w', encoding = 'utf-8', newline = '') as fp:
+    columns = [[] for _ in range(6)]
+    for name in names:
+      if rng.random() < 0.6:
+        columns[rng.randrange(6)].append(name)
+    cw = csv.writer(fp)
+    cw.writerow(('S', 'A', 'B', 'C', 'D', 'E'))
+    for row in range(max(len(column) for column in columns)):
+      cw.writerow([column[row] if row < len(column) else '' for column in columns])
+  with open(os.path.join(dirname, 'tl_konan.csv'), 'w', encoding = 'utf-8', newline = '') as fp:
+    cw = csv.writer(fp)
+    for tier in ('A', 'B+', 'C', 'D-'):
+      cw.writerow((tier,))
+      cw.writerows((name,) for name in rng.sample(names, len(names) // 10))
+  with open(os.path.join(dirname, 'tl_json.json'), 'w', encoding = 'utf-8') as fp:
+    json.dump(dict((name, round(rng.uniform(0.5, 4.5), 1)) for name in names if rng.random() < 0.5), fp)
+  with open(os.path.join(dirname, 'dhelper.cfg'), 'w', encoding = 'utf-8') as fp:
+    fp.write(_FIXTURECONFIG)
+  poolfns = []
+  for size in poolsizes:
+    fn = os.path.join(dirname, 'pool{0}.lst'.format(size))
+    with open(fn, 'w', encoding = 'utf-8') as fp:
+      left = size
+      for name in rng.sample(names, min(size, len(names))):
+        if left <= 0:
+          break
+        count = min(left, rng.choice((1, 1, 1, 2, 3)))
+        left -= count
+        setid, cardid = ids[name]
+        fp.write('{0} {1} (Set{2} #{3})\n'.format(count, name, setid, cardid))
+    poolfns.append(fn)
+  return poolfns
+
+
+# Runs fn repeat times, calling setup before each run outside the timing. Returns the durations.
+def _timeRuns(fn, repeat, setup = None):
+  times = []
+  for _ in range(repeat):
+    if setup is not None:
+      setup()
+    started = time.perf_counter()
+    fn()
+    times.append(time.perf_counter() - started)
+  return times
+
+
+def _result(name, times, calls = 1, **params):
+  result = {'name': name, 'params': params, 'runs': len(times),
+    'min': min(times), 'median': statistics.median(times)}
+  if calls != 1:
+    result['calls'] = calls
+    result['percall'] = min(times) / calls if calls else 0.0
+  return result
+
+
+def _quiet(fn):
+  def run():
+    with contextlib.redirect_stdout(io.StringIO()):
+      fn()
+  return run
+
+
+def _benchPool(fn, size, cards, repeat, results):
+  from .args import parseArgs
+  from .modes import handleQuarry
+  deckcards = loadDeckCards(fn, cards, warn = lambda *args: None)
+  results.append(_result('loadDeckCards', _timeRuns(lambda: loadDeckCards(fn, cards, warn = lambda *args: None), repeat),
+    pool = size))
+  dcards = list(deckcards.values())
+  for filtstr in BENCHFILTERS:
+    filt = Filter.fromString(filtstr)
+    test = filt.test
+    def testAll():
+      for dcard in dcards:
+        test(dcard)
+    results.append(_result('Filter.test', _timeRuns(testAll, repeat), calls = len(dcards), pool = size, filter = filtstr))
+  filt = Filter.fromString('c.nFT')
+  results.append(_result('FilteredDeck.fromDeck', _timeRuns(lambda: FilteredDeck.fromDeck(deckcards, filt), repeat),
+    pool = size, filter = 'c.nFT'))
+  fdeck = FilteredDeck.fromDeck(deckcards, Filter())
+  results.append(_result('Stats', _timeRuns(lambda: Stats(fdeck), repeat), pool = size))
+  results.append(_result('showRatingList', _timeRuns(_quiet(lambda: showRatingList(fdeck)), repeat), pool = size))
+  for args in (['quarry', '-d', fn], ['quarry', '-d', fn, '-m', '5', '-o'], ['quarry', '-d', fn, '-c']):
+    pargs = parseArgs(args)
+    results.append(_result('handleQuarry', _timeRuns(_quiet(lambda: handleQuarry(pargs)), repeat),
+      pool = size, args = ' '.join(args[3:])))
+
+
+# Generates fixtures (in dirname, or a temporary directory) and times the hot paths on them.
+# Returns a JSON serializable dict. The global configuration is pointed at the fixtures while
+# running and reloaded from the current directory afterwards.
+def runBench(ncards = 10000, poolsizes = (45, 500), repeat = 5, dirname = None, seed = 0):
+  results = []
+  report = {'python': platform.python_version(), 'unit': 'seconds', 'cards': ncards, 'pools': list(poolsizes),
+    'repeat': repeat, 'seed': seed, 'results': results}
+  cwd = os.getcwd()
+  with contextlib.ExitStack() as stack:
+    if dirname is None:
+      dirname = stack.enter_context(tempfile.TemporaryDirectory(prefix = 'dhelper-bench-'))
+    else:
+      os.makedirs(dirname, exist_ok = True)
+    started = time.perf_counter()
+    poolfns = makeFixtures(dirname, ncards, poolsizes, seed = seed)
+    report['fixtureseconds'] = time.perf_counter() - started
+    poolfns = [os.path.abspath(fn) for fn in poolfns]
+    os.chdir(dirname)
+    try:
+      loadConfig()
+      results.append(_result('loadCards', _timeRuns(lambda: loadCards(cls = RatedCard), repeat)))
+      cards = loadCards(cls = RatedCard)
+      tls = loadTierLists()
+      for tl in tls.tls.values():
+        results.append(_result('TierList.load', _timeRuns(tl.load, repeat), format = tl.cfg.format, entries = len(tl)))
+      invalidate = lambda: tls.setAggregation(mode = tls.mode)
+      results.append(_result('RatedCards', _timeRuns(lambda: RatedCards(cards, tls), repeat, setup = invalidate)))
+      from .lists import loadRatedCards
+      ratedcards = loadRatedCards()
+      for fn, size in zip(poolfns, poolsizes):
+        _benchPool(fn, size, ratedcards, repeat, results)
+    finally:
+      os.chdir(cwd)
+      loadConfig()
+  return report
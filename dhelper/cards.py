@@ -1,16 +1,19 @@
 __all__ = ['Card', 'mkFacStr', 'loadCards']
 
 import csv
+import sys
 
 from .util import FACTIONS, fixCardName
 from .config import CFG
 
 
 class Card(object):
+  __slots__ = ('name', 'cost', 'creq', 'rarity', 'ctype', 'setid', 'cardid', 'text', 'dam', 'life')
+
   def __init__(self, name, cost, creq, rarity, setid, cardid, ctype = None, text = None, dam = None, life = None):
     self.name = name
     self.cost = cost
-    self.creq = creq.upper()
+    self.creq = sys.intern(creq.upper())
     self.rarity = rarity
     self.ctype = ctype
     self.setid = setid
@@ -34,12 +37,14 @@ def mkFacStr(fcolors, *ccosts):
   return ''.join(result)
 
 
-def loadCards():
+# Card records are built with cls, so callers wanting a subclass such as RatedCard do not need to copy them.
+# Short strings repeated across many cards are interned so every card shares one copy.
+def loadCards(cls = Card):
   cardids = {}
   with open(CFG.cardids.filename, 'r', encoding = 'utf-8') as fp:
     csvr = csv.reader(fp)
     for setid, cardid, cardname in csvr:
-      cardids[cardname] = (setid, cardid)
+      cardids[cardname] = (sys.intern(setid), cardid)
   cards = {}
   with open(CFG.cards.filename, 'r', encoding = 'utf-8') as fp:
     csvr = csv.reader(fp)
@@ -47,7 +52,7 @@ def loadCards():
       if len(row) < 19 or row[0] == 'Reg':
         continue
       _reg,_prem,_cset,fac,typ,styp,name,rarity,cost,c1,c2,c3,c4,c5,dam,life,text,_rel,_upd = row
-      name = fixCardName(name.strip())
+      name = sys.intern(fixCardName(name.strip()))
       if name == 'Talon Drive':
         name = 'Talon Dive'
       if fac != 'Multi':
@@ -72,6 +77,6 @@ def loadCards():
         # print('Cannot get cardid for card: ', name)
         continue
       setid, cardid = idresult
-      cards[name] = Card(name, int(cost) if cost != '*' else '*', creq, rarity[0], setid, cardid,
-        ctype = typ, text = text, dam = dam, life = life)
+      cards[name] = cls(name, int(cost) if cost != '*' else '*', creq, sys.intern(rarity[0]), setid, cardid,
+        ctype = sys.intern(typ), text = text, dam = sys.intern(dam), life = sys.intern(life))
   return cards
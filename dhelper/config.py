@@ -1,6 +1,7 @@
 __all__ = ['DEFAULTCONFIG', 'Config', 'loadConfig']
 
 from configparser import ConfigParser
+from .aggregate import AGGREGATEMODES
 from .util import parseTime
 
 DEFAULTCONFIG = """
@@ -10,6 +11,8 @@ version = 20181012
 [general]
 # autoupdate may be "off" or a time specification in the format of <num><letter> where letter is one of s(econds), m(inutes), d(ays), (w)eeks. If not specified, the default is seconds.
 autoupdate = 1d
+# Compiled snapshot of the card database and tier lists. It is rebuilt automatically when any of the input files or the tier list configuration change. May be "off" to disable.
+snapshot = dhelper.snapshot
 
 [output]
 perline = 4
@@ -36,13 +39,23 @@ uri = https://gist.githubusercontent.com/KerfuffleV2/3955d0146ceb4d4d604d8e6d557
 
 [tierlists]
 use = flashtdc_new sunyveil flash_old konan_old
-# Mode may be one of "first" or "average".
+# Mode may be one of "first", "average", "median" or "trimmed" (mean without the highest and lowest trim fraction of the ratings).
 mode = first
+trim = 0.25
+# Recency decay: each list is weighted by another factor of decay per decaydays days it is older than the newest list.
+# A list's age is its date option (YYYY-MM-DD) if set, otherwise when its file last changed.
+# Lists may also set their own weight (default 1.0, 0 to ignore the list).
+decay = 1.0
+decaydays = 30
+# "zscore" puts every list on the same scale before combining them, useful when they rate differently. May be "off".
+normalize = off
+# Modules to import before loading the lists, for extra formats added with dhelper.tierlists.registerTierListFormat.
+plugins =
 
 
 [flashtdc_new]
 filename = tierlist_flashtdc.csv
-# Possible format values = simple sunyveil konan
+# Possible format values = simple tsv json sunyveil konan
 format = simple
 namecolumn = 1
 ratingcolumn = 7
@@ -76,11 +89,20 @@ gdgids = 1855443894 1981568523 210208637 1978666032 1420782532
 [deckmode]
 deck = deck.lst
 
+[server]
+# Address for the serve and client commands. Only bind to localhost unless you trust your network.
+host = 127.0.0.1
+port = 8722
+
 [quarrymode]
 deck = deck.lst
 minimumunits = 14
 maxcolors = 3
 minimumplayable = 26
+# Deck size and power range for --optimize.
+decksize = 45
+minimumpower = 15
+maximumpower = 19
 # If unset, cards without a tier value will be skipped.
 unknownscore = off
 """
@@ -120,6 +142,11 @@ def makeConfigModes(pcfg, cfg):
   qcfg.minunits = sec.getint('minimumunits')
   qcfg.maxcolors = sec.getint('maxcolors')
   qcfg.minplayable = sec.getint('minimumplayable')
+  qcfg.decksize = sec.getint('decksize', fallback = 45)
+  qcfg.minpower = sec.getint('minimumpower', fallback = 15)
+  qcfg.maxpower = sec.getint('maximumpower', fallback = 19)
+  if qcfg.minpower > qcfg.maxpower:
+    raise ValueError('Quarry minimumpower may not be above maximumpower')
   try:
     qunknownscore = sec.getboolean('unknownscore')
     if qunknownscore is False:
@@ -132,6 +159,15 @@ def makeConfigModes(pcfg, cfg):
 
 
 
+def makeConfigServer(pcfg, cfg):
+  sec = pcfg['server']
+  ncfg = Config()
+  cfg.server = ncfg
+  ncfg.host = sec.get('host', fallback = '127.0.0.1')
+  ncfg.port = sec.getint('port', fallback = 8722)
+
+
+
 def makeConfigGeneral(pcfg, cfg):
   sec = pcfg['general']
   ncfg = Config()
@@ -146,6 +182,10 @@ def makeConfigGeneral(pcfg, cfg):
     ncfg.autoupdate = False
   else:
     ncfg.autoupdate = parseTime(autoupdate)
+  snapshot = sec.get('snapshot', fallback = 'dhelper.snapshot').strip()
+  if snapshot.lower() in ('', 'off', 'no', 'false'):
+    snapshot = None
+  ncfg.snapshot = snapshot
   return ncfg
 
 
@@ -171,26 +211,32 @@ def makeConfigTierlists(pcfg, cfg):
   ncfg = Config()
   cfg.tierlists = ncfg
   mode = sec.get('mode', fallback = 'average').lower()
-  if mode not in ('average', 'first'):
-    raise ValueError('TierList mode must be one of average or first')
+  if mode not in AGGREGATEMODES:
+    raise ValueError('TierList mode must be one of {0}'.format(', '.join(AGGREGATEMODES)))
   ncfg.mode = mode
+  ncfg.decay = sec.getfloat('decay', fallback = 1.0)
+  if ncfg.decay <= 0:
+    raise ValueError('TierList decay must be above 0')
+  ncfg.decaydays = sec.getfloat('decaydays', fallback = 30.0)
+  if ncfg.decaydays <= 0:
+    raise ValueError('TierList decaydays must be above 0')
+  ncfg.trim = sec.getfloat('trim', fallback = 0.25)
+  if not 0.0 <= ncfg.trim < 0.5:
+    raise ValueError('TierList trim must be at least 0 and below 0.5')
+  normalize = sec.get('normalize', fallback = 'off').strip().lower()
+  if normalize not in ('zscore', 'off', 'no', 'false', ''):
+    raise ValueError('TierList normalize must be one of zscore or off')
+  ncfg.normalize = normalize == 'zscore'
   ncfg.use = sec.get('use', fallback = '').split(None)
+  ncfg.plugins = sec.get('plugins', fallback = '').split(None)
   ncfg.lists = []
   for tlname in ncfg.use:
     tlsec = pcfg[tlname]
     tlcfg = Config()
     tlcfg.name = tlname
-    tlformat = tlsec.get('format', fallback = 'simple')
-    tlcfg.format = tlformat
-    if tlformat == 'simple':
-      tlcfg.namecolumn = tlsec.getint('namecolumn')
-      tlcfg.ratingcolumn = tlsec.getint('ratingcolumn')
-    elif tlformat == 'sunyveil':
-      tlcfg.ratingconversion = tlsec['ratingconversion']
-    elif tlformat == 'konan':
-      tlcfg.ratingconversion = tlsec['ratingconversion']
-    else:
-      raise ValueError('Bad format type in tierlist definition')
+    tlcfg.format = tlsec.get('format', fallback = 'simple')
+    # Format specific options are read by the format's TierList class.
+    tlcfg.options = dict(tlsec.items())
     ncfg.lists.append(tlcfg)
     mclHelper(tlsec, tlcfg)
 
@@ -219,6 +265,7 @@ def loadConfig():
   makeConfigOutput(pcfg, CFG)
   makeConfigGeneral(pcfg, CFG)
   makeConfigModes(pcfg, CFG)
+  makeConfigServer(pcfg, CFG)
   makeConfigCards(pcfg, CFG)
   makeConfigCardIds(pcfg, CFG)
   makeConfigTierlists(pcfg, CFG)
@@ -1,6 +1,10 @@
-__all__ = ['DeckCard', 'loadDeckCards', 'saveDeckCards']
+__all__ = ['DeckCard', 'DeckReport', 'iterDeckCards', 'parseDeckLines', 'loadDeckCards', 'saveDeckCards']
 
+import contextlib
 import re
+import sys
+
+from .timings import stage
 from .util import fixCardName
 
 
@@ -8,6 +12,8 @@ _MARKETMARKER = '--------------MARKET---------------'
 
 
 class DeckCard(object):
+  __slots__ = ('name', 'card', 'count', 'unrated', 'market')
+
   @classmethod
   def mk(cls, name, cards, count = 1, market = False):
     card = cards.get(name)
@@ -40,32 +46,129 @@ def saveDeckCards(fn, deckcards):
         print(dc.toEternalFormat(), file = fp)
 
 
-deckcardre = re.compile(r'^(\d+)\s+([^(]+\S)\s+(?:[(].*[)])\s*$')
-def loadDeckCards(fn, cards):
+# Count, name and, as Eternal exports them, the set and card id: 2 Torch (Set1 #5)
+deckcardre = re.compile(r'^(\d+)\s+([^(]+\S)\s+(?:[(](?:Set(\d+)\s*#(\d+))?.*[)])\s*$')
+
+
+# Problems found while reading decks. They are collected rather than printed as they are found, so
+# an unknown card is reported once however often it appears and a broken export does not flood
+# the terminal.
+class DeckReport(object):
+  # Unparseable lines quoted in the report, the rest are only counted.
+  MAXEXAMPLES = 5
+
+  def __init__(self):
+    self.lines = 0
+    self.cards = 0
+    self.badlines = 0
+    self.badexamples = []
+    self.unknown = {}
+
+  def badLine(self, source, lineno, line):
+    self.badlines += 1
+    if len(self.badexamples) < self.MAXEXAMPLES:
+      self.badexamples.append((source, lineno, line))
+
+  def unknownCard(self, name, count, source, lineno):
+    entry = self.unknown.get(name)
+    if entry is None:
+      self.unknown[name] = [count, source, lineno]
+    else:
+      entry[0] += count
+
+  def __bool__(self):
+    return bool(self.badlines or self.unknown)
+
+  # Yields the report one message at a time. Suggestions for unknown cards are looked up in cards.
+  def messages(self, cards = None):
+    for name, (count, source, lineno) in self.unknown.items():
+      suggestions = cards.nameindex.fuzzy(name, limit = 3) if cards is not None else None
+      hint = ' (did you mean: {0}?)'.format('; '.join(sname for _,sname in suggestions)) if suggestions else ''
+      yield 'WARNING: Unknown card: {0}{1} ({2}x, {3} line {4})'.format(name, hint, count, source, lineno)
+    for source, lineno, line in self.badexamples:
+      yield 'Unknown: {0} ({1} line {2})'.format(line, source, lineno)
+    if self.badlines > len(self.badexamples):
+      yield 'Unknown: {0} more lines'.format(self.badlines - len(self.badexamples))
+
+  def emit(self, warn = print, cards = None):
+    for message in self.messages(cards):
+      warn(message)
+
+
+def _openDeck(source):
+  if source == '-':
+    return contextlib.nullcontext(sys.stdin), '<stdin>'
+  if isinstance(source, str):
+    return open(source, 'r', encoding = 'utf-8'), source
+  return contextlib.nullcontext(source), getattr(source, 'name', '<lines>')
+
+
+# Reads deck exports from sources (file names, "-" for stdin or iterables of lines) one line at a
+# time. Cards are found by set and card id when the line has them and cards is a RatedCards, by
+# name otherwise. Each card is yielded when it is first seen and later lines add to its count, so
+# the counts are complete once the generator is exhausted. Exports may be concatenated: the market
+# section ends with its file or at a blank line. Problems go to report.
+def iterDeckCards(sources, cards, report = None):
+  if report is None:
+    report = DeckReport()
+  if isinstance(sources, str):
+    sources = [sources]
   deckcards = {}
-  market = False
-  with open(fn, 'r', encoding = 'utf-8') as fp:
-    for line in fp:
-      line = line.strip()
-      if line == '' or line[0] == '#':
-        continue
-      if line == _MARKETMARKER:
-        market = True
-        continue
-      result = deckcardre.match(line)
-      if result is None:
-        print('Unknown:',line)
-        continue
-      count,cardname = result.groups()
-      cardname = fixCardName(cardname)
-      count = int(count)
-      deckcard = deckcards.get(cardname)
-      if deckcard is None:
+  match = deckcardre.match
+  idindex = getattr(cards, 'idindex', None) or {}
+  for source in sources:
+    opened, sourcename = _openDeck(source)
+    with opened as lines:
+      market = False
+      for lineno, line in enumerate(lines, 1):
+        report.lines += 1
+        line = line.strip()
+        if line == '':
+          market = False
+          continue
+        if line[0] == '#':
+          continue
+        if line == _MARKETMARKER:
+          market = True
+          continue
+        result = match(line)
+        if result is None:
+          report.badLine(sourcename, lineno, line)
+          continue
+        count,cardname,setid,cardid = result.groups()
+        # The id survives renames, the name is the fallback for hand written lists.
+        idname = idindex.get((setid, cardid)) if setid is not None else None
+        cardname = fixCardName(cardname) if idname is None else idname
+        count = int(count)
+        report.cards += count
+        deckcard = deckcards.get(cardname)
+        if deckcard is not None:
+          deckcard.count += count
+          continue
         deckcard = DeckCard.mk(cardname, cards, count = count, market = market)
         if deckcard is None:
-          print('WARNING: Unknown card:', cardname)
+          report.unknownCard(cardname, count, sourcename, lineno)
           continue
-      else:
-        deckcard.count += count
-      deckcards[cardname] = deckcard
+        deckcards[cardname] = deckcard
+        yield deckcard
+
+
+def _collectDeckCards(sources, cards, warn, report):
+  emit = report is None
+  if emit:
+    report = DeckReport()
+  deckcards = dict((dcard.name, dcard) for dcard in iterDeckCards(sources, cards, report))
+  if emit:
+    report.emit(warn, cards)
   return deckcards
+
+
+# Returns {name: DeckCard} for the cards in fn, which may also be a list of files or "-" for stdin.
+# Problems are passed to warn once everything is read, or left in report if one is given.
+def loadDeckCards(fn, cards, warn = print, report = None):
+  with stage('loadDeckCards'):
+    return _collectDeckCards(fn, cards, warn, report)
+
+
+def parseDeckLines(lines, cards, warn = print, report = None):
+  return _collectDeckCards([lines], cards, warn, report)
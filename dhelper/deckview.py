@@ -0,0 +1,77 @@
+__all__ = ['COSTBUCKETS', 'DeckView', 'costBucket']
+
+from .util import colorMask
+
+
+# Power cost groups of the by-cost listing: 0 (cards costing '*' included), 1 to 9 each and 10 up.
+COSTBUCKETS = ((-100,0), (1,1), (2,2), (3,3), (4,4), (5,5), (6,6), (7,7), (8,8), (9,9), (10,100))
+
+
+# Index into COSTBUCKETS for a card cost, None when no bucket takes it.
+def costBucket(cost):
+  if cost == '*':
+    return 0
+  if cost < -100 or cost > 100:
+    return None
+  return max(0, min(cost, 10))
+
+
+# Deck cards sorted by rating once, best first, with each card's cost bucket and influence mask
+# kept alongside. Selections and cost buckets are index lists into that order, so views of part
+# of the deck never need sorting again and a listing looks at every card once.
+# Cards missing from the card database are left out, no filter passes them either.
+class DeckView(object):
+  def __init__(self, deckcards = ()):
+    if isinstance(deckcards, dict):
+      deckcards = deckcards.values()
+    self.deck = sorted((dcard for dcard in deckcards if dcard.card is not None),
+      key = lambda dcard: dcard.card.rating, reverse = True)
+    self.costs = [costBucket(dcard.card.cost) for dcard in self.deck]
+    self.masks = [colorMask(dcard.card.creq) for dcard in self.deck]
+    self._bymask = None
+
+  def __iter__(self):
+    return self.deck.__iter__()
+
+  def __len__(self):
+    return len(self.deck)
+
+  # Positions of the cards per influence mask, built on first use.
+  @property
+  def bymask(self):
+    if self._bymask is None:
+      bymask = {}
+      for idx, mask in enumerate(self.masks):
+        bymask.setdefault(mask, []).append(idx)
+      self._bymask = bymask
+    return self._bymask
+
+  # The view of the cards at positions idxs, which must be in ascending order.
+  def subView(self, idxs):
+    view = DeckView()
+    deck, costs, masks = self.deck, self.costs, self.masks
+    view.deck = [deck[idx] for idx in idxs]
+    view.costs = [costs[idx] for idx in idxs]
+    view.masks = [masks[idx] for idx in idxs]
+    return view
+
+  # Cards passing filt and, with within given, whose influence fits in the color mask within
+  # (what a c.n<colors> filter passes). Candidates for within come from the mask index.
+  def select(self, filt = None, within = None):
+    if within is None:
+      idxs = range(len(self.deck))
+    else:
+      idxs = sorted(idx for mask,midxs in self.bymask.items() if mask & ~within == 0 for idx in midxs)
+    if filt is not None:
+      test = filt.test
+      deck = self.deck
+      idxs = [idx for idx in idxs if test(deck[idx])]
+    return self.subView(idxs)
+
+  # A view per cost bucket in COSTBUCKETS order.
+  def byCost(self):
+    buckets = [[] for _ in COSTBUCKETS]
+    for idx, bucket in enumerate(self.costs):
+      if bucket is not None:
+        buckets[bucket].append(idx)
+    return [self.subView(idxs) for idxs in buckets]
@@ -0,0 +1,158 @@
+__all__ = ['FETCHERRORS', 'ConnectionPool', 'fetchCSVs', 'getCSV']
+
+import concurrent.futures
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+from .lists import loadFetchMeta, needsUpdate
+from .util import atomicWrite
+
+
+_GDURIFORMAT = 'https://docs.google.com/spreadsheets/d/{key}/export?format=csv&gid={pagegid}'
+_USERAGENT = 'DHelper+urllib'
+_MAXWORKERS = 8
+_MAXREDIRECTS = 5
+FETCHERRORS = (IOError, urllib.error.URLError, http.client.HTTPException)
+
+
+# Keep-alive HTTP(S) connections shared by the fetch workers, one per host per thread.
+class ConnectionPool(object):
+  def __init__(self, timeout = 60):
+    self.timeout = timeout
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.conns = []
+
+  def __getconn(self, scheme, netloc, fresh = False):
+    conns = getattr(self.local, 'conns', None)
+    if conns is None:
+      conns = self.local.conns = {}
+    key = (scheme, netloc)
+    conn = conns.get(key)
+    if conn is not None and fresh:
+      conn.close()
+      conn = None
+    if conn is None:
+      if scheme == 'https':
+        conn = http.client.HTTPSConnection(netloc, timeout = self.timeout)
+      elif scheme == 'http':
+        conn = http.client.HTTPConnection(netloc, timeout = self.timeout)
+      else:
+        raise urllib.error.URLError('Unsupported URI scheme: {0}'.format(scheme))
+      conns[key] = conn
+      with self.lock:
+        self.conns.append(conn)
+    return conn
+
+  def get(self, uri, headers):
+    for _ in range(_MAXREDIRECTS):
+      parts = urllib.parse.urlsplit(uri)
+      path = parts.path or '/'
+      if parts.query:
+        path += '?' + parts.query
+      for attempt in range(2):
+        conn = self.__getconn(parts.scheme, parts.netloc, fresh = attempt > 0)
+        try:
+          conn.request('GET', path, headers = headers)
+          resp = conn.getresponse()
+          data = resp.read()
+          break
+        except (http.client.HTTPException, ConnectionError):
+          # The server may have dropped an idle keep-alive connection, retry once on a new one.
+          if attempt > 0:
+            raise
+      if resp.status in (301, 302, 303, 307, 308):
+        uri = urllib.parse.urljoin(uri, resp.getheader('Location', ''))
+        continue
+      if resp.status not in (200, 304):
+        raise urllib.error.HTTPError(uri, resp.status, resp.reason, resp.headers, None)
+      return resp.status, resp.headers, data
+    raise urllib.error.URLError('Too many redirects fetching {0}'.format(uri))
+
+  def close(self):
+    with self.lock:
+      for conn in self.conns:
+        conn.close()
+      self.conns = []
+
+
+def listURIs(cfg):
+  if cfg.source == 'googledocs':
+    return tuple(_GDURIFORMAT.format(key = cfg.gdkey, pagegid = pagegid) for pagegid in cfg.gdgids)
+  elif cfg.source == 'uri':
+    return (cfg.uri,)
+  raise ValueError('Unknown source type in getCSV')
+
+
+def fetchURI(pool, uri, urimeta = None):
+  headers = {'User-Agent': _USERAGENT}
+  if urimeta:
+    if urimeta.get('etag'):
+      headers['If-None-Match'] = urimeta['etag']
+    if urimeta.get('lastmodified'):
+      headers['If-Modified-Since'] = urimeta['lastmodified']
+  status, respheaders, data = pool.get(uri, headers)
+  if status == 304:
+    return None, urimeta
+  return data, {'etag': respheaders.get('ETag'), 'lastmodified': respheaders.get('Last-Modified')}
+
+
+# Fetches every page of every list concurrently and writes each list atomically.
+# Returns a list of (filename, error) for the lists that failed.
+def fetchCSVs(cfgs, maxworkers = _MAXWORKERS):
+  pool = ConnectionPool()
+  errors = []
+  try:
+    with concurrent.futures.ThreadPoolExecutor(max_workers = maxworkers) as executor:
+      jobs = []
+      for cfg in cfgs:
+        fn = cfg.filename
+        uris = listURIs(cfg)
+        meta = loadFetchMeta(fn) if os.path.isfile(fn) else {}
+        urimetas = meta.get('uris', {})
+        futures = []
+        for uri in uris:
+          print('** Fetching {fn} from: {uri}'.format(fn = fn, uri = uri))
+          futures.append(executor.submit(fetchURI, pool, uri, urimetas.get(uri)))
+        jobs.append((cfg, uris, futures))
+      for cfg, uris, futures in jobs:
+        try:
+          finishCSV(executor, pool, cfg, uris, futures)
+        except FETCHERRORS as err:
+          errors.append((cfg.filename, err))
+  finally:
+    pool.close()
+  return errors
+
+
+def finishCSV(executor, pool, cfg, uris, futures):
+  fn = cfg.filename
+  results = [f.result() for f in futures]
+  if all(data is None for data,_ in results):
+    print('** {0} not modified.'.format(fn))
+  else:
+    # Only some pages changed: the unchanged ones still have to be fetched to rebuild the file.
+    refetch = dict((idx, executor.submit(fetchURI, pool, uris[idx]))
+      for idx,(data,_) in enumerate(results) if data is None)
+    for idx, future in refetch.items():
+      results[idx] = future.result()
+    atomicWrite(fn, (data for data,_ in results))
+    print('** {0} created. Size: {1}.'.format(fn, sum(len(data) for data,_ in results)))
+  meta = {
+    'checked': time.time(),
+    'uris': dict((uri, urimeta) for uri,(_,urimeta) in zip(uris, results) if urimeta),
+  }
+  atomicWrite(fn + '.meta', (json.dumps(meta, indent = 1),), mode = 'w', encoding = 'utf-8')
+
+
+def getCSV(cfg, autoupdate = False, force = False):
+  if not needsUpdate(cfg, autoupdate = autoupdate, force = force):
+    return
+  errors = fetchCSVs((cfg,))
+  if errors:
+    raise errors[0][1]
@@ -1,6 +1,8 @@
 __all__ = ['FILTERHELP', 'ColorFilter', 'Filter', 'FilteredDeck']
 
-from .util import FACTIONS
+import functools
+
+from .util import FACTIONS, colorMask
 
 
 FILTERHELP = '''\
@@ -77,23 +79,36 @@ class ColorFilter(object):
   def __init__(self, color = '', typ = None):
     self.color = color.upper()
     self.type = typ if typ is not None else self.CFANY
+    self.mask = colorMask(self.color)
+    self.masktest = self.compile()
 
 
-  def test(self, creq):
+  # Returns a predicate taking (creq mask, creq) specialized for this filter's type and colors.
+  def compile(self):
+    fmask = self.mask
     if self.type == self.CFANY:
-      cset = set(creq)
-      return all(c in cset for c in set(self.color))
+      return lambda cmask, _creq: cmask & fmask == fmask
     elif self.type == self.CFEXACT:
-      return creq == self.color
+      color = self.color
+      return lambda _cmask, creq: creq == color
     elif self.type == self.CFCOLORS:
-      return set(creq) == set(self.color)
+      return lambda cmask, _creq: cmask == fmask
     elif self.type == self.CFLOOSE:
-      cset = set(self.color)
-      return all(c in cset for c in set(creq))
+      return lambda cmask, _creq: cmask & ~fmask == 0
     else:
       raise ValueError('Unhandled color filter type.')
 
 
+  def test(self, creq):
+    return self.masktest(colorMask(creq), creq)
+
+
+# Parsed filters are immutable and shared, see Filter.fromString.
+@functools.lru_cache(maxsize = 512)
+def _parseFilter(cls, filterstr):
+  return cls.parse(filterstr)
+
+
 class Filter(object):
 
   def __init__(self, ratinglimit = -100, costrange = (-100, 100),
@@ -102,64 +117,78 @@ class Filter(object):
     self.allowunknown = allowunknown
     self.costrange = costrange
     self.colorfilter = colorfilter
+    self.test = self.compile()
+
+
+  # Builds a single predicate on deck cards with the limits and color masks baked in.
+  def compile(self):
+    ratinglimit = self.ratinglimit
+    allowunknown = self.allowunknown
+    mincost, maxcost = self.costrange
+    colortests = tuple(cfentry.masktest for cfentry in self.colorfilter) if self.colorfilter else ()
+    if len(colortests) == 1:
+      colortest = colortests[0]
+    elif colortests:
+      colortest = lambda cmask, creq: any(ct(cmask, creq) for ct in colortests)
+    else:
+      colortest = None
 
-  def __colorfiltf(self, card):
-    if card is None:
-      return False
-    if not self.colorfilter:
-      return True
-    for cfentry in self.colorfilter:
-      if cfentry.test(card.creq):
-        return True
-    return False
-
-
-  def __costfiltf(self, card):
-    if card is None:
-      return False
-    costrange = self.costrange
-    if card.cost == '*':
-      if costrange[0] > 0:
+    def test(dcard):
+      card = dcard.card
+      if card is None:
+        return False
+      if dcard.unrated:
+        if not allowunknown:
+          return False
+      elif card.rating < ratinglimit:
+        return False
+      cost = card.cost
+      if cost == '*':
+        if mincost > 0:
+          return False
+      elif cost < mincost or cost > maxcost:
         return False
+      if colortest is not None:
+        creq = card.creq
+        return colortest(colorMask(creq), creq)
       return True
-    return card.cost >= costrange[0] and card.cost <= costrange[1]
+    return test
 
 
+  # Parses and compiles a filter string. Results are memoized, callers must not modify them.
   @classmethod
   def fromString(cls, filterstr):
-    filt = cls()
+    return _parseFilter(cls, filterstr)
+
+
+  @classmethod
+  def parse(cls, filterstr):
+    ratinglimit = -100
+    costrange = (-100, 100)
+    colorfilter = ''
     for s in filterstr.strip().split(':'):
       s = s.strip()
       if s == '':
         continue
       if s[0] == 'r':
-        filt.ratinglimit = float(s[1:])
+        ratinglimit = float(s[1:])
       elif s[0] == 'p':
         powerparts = s[1:].split(',', 1)
         pplen = len(powerparts)
         if pplen == 0 or pplen > 2:
           raise ValueError('Bad power filter.')
         elif pplen == 1:
-          filt.costrange = (-100, float(powerparts[0]))
+          costrange = (-100, float(powerparts[0]))
         else:
-          filt.costrange = (float(powerparts[0]), float(powerparts[1]))
+          costrange = (float(powerparts[0]), float(powerparts[1]))
       elif s[0] == 'c':
         cfilts = []
         for cpart in s[1:].split(','):
           cfilts.append(ColorFilter.fromString(cpart))
-        filt.colorfilter = cfilts
+        colorfilter = cfilts
       else:
         raise ValueError('Bad filter part: {0}'.format(s))
-    return filt
-
-
-  def test(self, dcard):
-    card = dcard.card
-    ok = (self.allowunknown and dcard.unrated) or \
-      (not dcard.unrated and card.rating >= self.ratinglimit)
-    ok = ok and self.__colorfiltf(card)
-    ok = ok and self.__costfiltf(card)
-    return ok
+    return cls(ratinglimit = ratinglimit, costrange = costrange, colorfilter = colorfilter)
 
 
 class FilteredDeck(object):
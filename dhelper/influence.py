@@ -0,0 +1,234 @@
+__all__ = ['HANDSIZE', 'InfluenceCalc', 'influenceNeeds', 'requirements', 'powerSources', 'colorSources', 'deckColors',
+  'parseSigils', 'suggestPowerBase']
+
+import collections
+import functools
+import itertools
+import math
+
+from .util import COLORBITS, NUMCOLORMASKS, colorMask
+
+
+# Cards in the opening hand. On the play a card costing c is on curve with HANDSIZE + c - 1 cards
+# seen, one more on the draw. Cards costing 0 or '*' count as turn 1 plays.
+HANDSIZE = 7
+
+_COLORS = 'FTJPS'
+
+
+# Rows of Pascal's triangle as exact integers, cached per n.
+@functools.lru_cache(maxsize = None)
+def _binomials(n):
+  return tuple(math.comb(n, k) for k in range(n + 1))
+
+
+def _comb(n, k):
+  return _binomials(n)[k] if 0 <= k <= n else 0
+
+
+# The influence a requirement such as 'TTJ' asks for as ((color bit, count), ...), () for neutral
+# cards and None for requirements with unknown colors.
+@functools.lru_cache(maxsize = 1024)
+def influenceNeeds(creq):
+  counts = collections.Counter(creq.upper())
+  counts.pop('N', None)
+  if any(c not in _COLORS for c in counts):
+    return None
+  return tuple(sorted((COLORBITS[c], count) for c,count in counts.items()))
+
+
+# Ways of drawing the sources that meet needs, by the number of sources drawn. Groups are
+# ((color mask, sources), ...) for the sources producing any of the needed colors. Each source
+# gives one influence of every color in its mask. Counts beyond the need are capped, so the states
+# stay few whatever the number of sources.
+@functools.lru_cache(maxsize = 4096)
+def _hitWeights(needs, groups):
+  full = tuple(count for _,count in needs)
+  states = {(0, (0,) * len(needs)): 1}
+  for mask, sources in groups:
+    row = _binomials(sources)
+    grown = collections.defaultdict(int)
+    for (drawn, got), ways in states.items():
+      for taken in range(sources + 1):
+        have = tuple(min(need, count + taken) if mask & bit else count for (bit, need),count in zip(needs, got))
+        grown[(drawn + taken, have)] += ways * row[taken]
+    states = grown
+  hits = collections.defaultdict(int)
+  for (drawn, got), ways in states.items():
+    if got == full:
+      hits[drawn] += ways
+  return tuple(sorted(hits.items()))
+
+
+# Probability that seen cards from a deck of decksize hold the needed influence: the multivariate
+# hypergeometric sum over the ways of drawing the relevant sources, with the rest of the seen
+# cards from everything else.
+@functools.lru_cache(maxsize = 16384)
+def _chance(needs, groups, decksize, seen):
+  seen = min(seen, decksize)
+  others = decksize - sum(sources for _,sources in groups)
+  hits = sum(ways * _comb(others, seen - drawn) for drawn,ways in _hitWeights(needs, groups))
+  return hits / _comb(decksize, seen)
+
+
+# Influence sources of the power cards and sigils in deckcards as {color mask: copies}. Neutral
+# power and power of unknown colors gives no influence and is left out.
+def powerSources(deckcards):
+  sources = collections.Counter()
+  for dcard in deckcards:
+    card = dcard.card
+    if card.ctype != 'Power' and card.ctype != 'Sigil':
+      continue
+    mask = colorMask(card.creq)
+    if mask >= NUMCOLORMASKS or not mask:
+      continue
+    sources[mask] += dcard.count
+  return sources
+
+
+# Sources producing each color, {color: copies} in FTJPS order for the colors with any.
+def colorSources(sources):
+  counts = collections.OrderedDict()
+  for c in _COLORS:
+    count = sum(copies for mask,copies in sources.items() if mask & COLORBITS[c])
+    if count:
+      counts[c] = count
+  return counts
+
+
+# The colors the influence requirements of the cards other than power ask for, in FTJPS order.
+def deckColors(deckcards):
+  needed = 0
+  for dcard in deckcards:
+    if dcard.card.ctype != 'Power' and dcard.card.ctype != 'Sigil':
+      needed |= colorMask(dcard.card.creq)
+  return ''.join(c for c in _COLORS if needed & COLORBITS[c])
+
+
+# Parses sigil counts written like the quarry deck line, '8F 7T' or '8F' '7T', into {color: count}.
+def parseSigils(items):
+  sigils = collections.OrderedDict()
+  for item in itertools.chain.from_iterable(item.split() for item in items):
+    count, color = item[:-1], item[-1:].upper()
+    if color not in _COLORS or not count.isdigit():
+      raise ValueError('Bad sigil count: {0} (expected a number and a color like 8F)'.format(item))
+    sigils[color] = sigils.get(color, 0) + int(count)
+  return sigils
+
+
+# On curve influence odds for a deck of decksize cards with the given sources ({color mask: copies}).
+# Results are cached per requirement and source counts, not per card, so evaluating every card
+# at every turn, or many power bases, costs one calculation per distinct requirement.
+class InfluenceCalc(object):
+  def __init__(self, decksize, sources, draw = False):
+    self.decksize = decksize
+    self.sources = dict(sources)
+    self.draw = draw
+    self._groups = {}
+
+  # Sources per color mask for the colors in needmask, in a canonical order for the caches.
+  def groups(self, needmask):
+    groups = self._groups.get(needmask)
+    if groups is None:
+      groups = self._groups[needmask] = tuple(sorted((mask, count)
+        for mask,count in self.sources.items() if mask & needmask and count))
+    return groups
+
+  def seen(self, turn):
+    return HANDSIZE + turn - 1 + (1 if self.draw else 0)
+
+  # Probability of having the influence of creq by turn, None for unknown colors.
+  def chance(self, creq, turn):
+    needs = influenceNeeds(creq)
+    if needs is None:
+      return None
+    if not needs:
+      return 1.0
+    groups = self.groups(sum(bit for bit,_ in needs))
+    return _chance(needs, groups, self.decksize, self.seen(turn))
+
+  # Probabilities for turns 1 to maxturn.
+  def chances(self, creq, maxturn):
+    return [self.chance(creq, turn) for turn in range(1, maxturn + 1)]
+
+  @staticmethod
+  def curveTurn(card):
+    return card.cost if isinstance(card.cost, int) and card.cost > 1 else 1
+
+  def onCurve(self, card):
+    return self.chance(card.creq, self.curveTurn(card))
+
+  # Copy weighted average on curve probability of the cards other than power, None without such cards.
+  def consistency(self, deckcards):
+    return self.average(requirements(deckcards))
+
+  # Copy weighted average probability for requirements as from requirements().
+  def average(self, reqs):
+    total = 0.0
+    copies = 0
+    for (creq, turn), count in reqs:
+      chance = self.chance(creq, turn)
+      if chance is None:
+        continue
+      total += chance * count
+      copies += count
+    return total / copies if copies else None
+
+
+# The cards other than power in deckcards as ((creq, on curve turn), copies) pairs, one per distinct
+# requirement and turn.
+def requirements(deckcards):
+  reqs = collections.Counter()
+  for dcard in deckcards:
+    card = dcard.card
+    if card.ctype != 'Power' and card.ctype != 'Sigil':
+      reqs[(card.creq, InfluenceCalc.curveTurn(card))] += dcard.count
+  return tuple(reqs.items())
+
+
+# The best ways to fill a power base of power cards with sigils of colors, best first, as
+# [(consistency, {color: sigils}), ...]. The deck's power cards other than sigils are kept, its
+# sigils are replaced and the deck size is its other cards plus power.
+def suggestPowerBase(deckcards, colors, power, draw = False, top = 3):
+  deckcards = [dcard for dcard in deckcards if dcard.card.ctype != 'Sigil']
+  fixed = powerSources(deckcards)
+  nonsigils = sum(dcard.count for dcard in deckcards if dcard.card.ctype == 'Power')
+  slots = max(0, power - nonsigils)
+  decksize = sum(dcard.count for dcard in deckcards) + slots
+  colors = [c for c in colors if c in _COLORS]
+  results = []
+  if not colors:
+    return results
+  seenextra = HANDSIZE - 1 + (1 if draw else 0)
+  # Neutral cards are always castable, the others are evaluated per distinct requirement.
+  certain = 0
+  entries = []
+  for (creq, turn), count in requirements(deckcards):
+    needs = influenceNeeds(creq)
+    if needs is None:
+      continue
+    if needs:
+      entries.append((needs, sum(bit for bit,_ in needs), turn + seenextra, count))
+    else:
+      certain += count
+  copies = certain + sum(entry[3] for entry in entries)
+  if not copies:
+    return results
+  # Every split of the slots between the colors, as the cut points between them.
+  for cuts in itertools.combinations_with_replacement(range(slots + 1), len(colors) - 1):
+    bounds = (0,) + cuts + (slots,)
+    sigils = collections.OrderedDict((c, bounds[idx + 1] - bounds[idx]) for idx,c in enumerate(colors))
+    sources = collections.Counter(fixed)
+    for c, count in sigils.items():
+      sources[COLORBITS[c]] += count
+    sources = sorted(item for item in sources.items() if item[1])
+    groups = {}
+    total = float(certain)
+    for needs, needmask, seen, count in entries:
+      needgroups = groups.get(needmask)
+      if needgroups is None:
+        needgroups = groups[needmask] = tuple(item for item in sources if item[0] & needmask)
+      total += _chance(needs, needgroups, decksize, seen) * count
+    results.append((total / copies, sigils))
+  results.sort(key = lambda result: result[0], reverse = True)
+  return results[:top]
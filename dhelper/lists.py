@@ -1,74 +1,137 @@
-__all__ = ['loadRatedCards', 'checkLists']
+__all__ = ['loadRatedCards', 'currentRatedCards', 'refreshRatedCards', 'setBackgroundUpdates', 'buildRatedCards', 'checkLists', 'needsUpdate']
 
-import urllib
-import urllib.request
-import urllib.error
+import json
 import sys
 import os
+import threading
 import time
 
 from .config import CFG
 from .cards import loadCards
-from .tierlists import loadTierLists, RatedCards
+from .tierlists import loadTierLists, RatedCard, RatedCards
+from .snapshot import snapshotKey, loadSnapshot, saveSnapshot
+from .timings import stage
 
 
-_GDURIFORMAT = 'https://docs.google.com/spreadsheets/d/{key}/export?format=csv&gid={pagegid}'
-def getCSV(cfg, autoupdate = False, force = False):
+def loadFetchMeta(fn):
+  try:
+    with open(fn + '.meta', 'r', encoding = 'utf-8') as fp:
+      meta = json.load(fp)
+  except (IOError, ValueError):
+    return {}
+  return meta if isinstance(meta, dict) else {}
+
+
+def needsUpdate(cfg, autoupdate = False, force = False):
   fn = cfg.filename
-  if os.path.isfile(fn):
-    if autoupdate is not False:
-      now = time.time()
-      mtime = os.path.getmtime(fn)
-      age = now - mtime
-      if age < autoupdate and not force:
-        return
-    elif not force:
-      return
-  if cfg.source == 'googledocs':
-    uris = tuple(_GDURIFORMAT.format(key = cfg.gdkey, pagegid = pagegid) for pagegid in cfg.gdgids)
-  elif cfg.source == 'uri':
-    uris = (cfg.uri,)
-  else:
-    raise ValueError('Unknown source type in getCSV')
-  datalist = []
-  for uri in uris:
-    print('** Fetching {fn} from: {uri}'.format(
-      fn = fn, uri = uri))
-    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor())
-    ua = 'DHelper+urllib'
-    req = urllib.request.Request(uri, headers = {'User-Agent': ua })
-    resp = opener.open(req)
-    data = resp.read()
-    datalist.append(data)
-  size = 0
-  with open(fn, 'wb') as fp:
-    for data in datalist:
-      size += len(data)
-      fp.write(data)
-  print('** {0} created. Size: {1}.'.format(fn, size))
+  if force or not os.path.isfile(fn):
+    return True
+  if autoupdate is False:
+    return False
+  checked = loadFetchMeta(fn).get('checked')
+  if not isinstance(checked, (int, float)):
+    checked = os.path.getmtime(fn)
+  return time.time() - checked >= autoupdate
+
+
+# The most recently loaded (key, RatedCards), reused while the card files and list configuration
+# stay the same. Replaced as a whole under _LOCK, so other threads see either the old or the new one.
+_LOADED = [None, None]
+_LOCK = threading.RLock()
+# Held while checking and fetching the list files, so a background refresh and a mode loading its
+# data never fetch the same missing file twice.
+_FETCHLOCK = threading.Lock()
+# Set while the interactive shell (see shell.py) runs refreshRatedCards in the background: then
+# loadRatedCards only fetches files that are missing and never waits for an update check.
+_BACKGROUND = [False]
+
+
+def setBackgroundUpdates(enabled):
+  _BACKGROUND[0] = enabled
+
+
+def _install(key, ratedcards, previous):
+  _LOADED[:] = [key, ratedcards]
+  if previous is not None and previous is not ratedcards:
+    for callback in previous.listeners:
+      ratedcards.subscribe(callback)
+    ratedcards.notify(set(ratedcards.keys()))
 
 
 def loadRatedCards():
+  with stage('checkLists'):
+    checkLists(autoupdate = False if _BACKGROUND[0] else None)
+  with _LOCK:
+    key = snapshotKey()
+    prevkey, ratedcards = _LOADED
+    if prevkey != key:
+      previous = ratedcards
+      with stage('loadSnapshot'):
+        ratedcards = loadSnapshot(key)
+      if ratedcards is None:
+        ratedcards = buildRatedCards()
+        with stage('saveSnapshot'):
+          saveSnapshot(key, ratedcards)
+      _install(key, ratedcards, previous)
+    if ratedcards.tls.stale():
+      with stage('refresh'):
+        ratedcards.refresh()
+      with stage('saveSnapshot'):
+        saveSnapshot(key, ratedcards)
+    return ratedcards
+
+
+# The RatedCards last loaded or refreshed, None before the first load.
+def currentRatedCards():
+  return _LOADED[1]
+
+
+# Fetches due updates and, if anything changed, loads the new data into a separate RatedCards
+# which then replaces the current one in one step. The current one is never modified, so it can
+# stay in use meanwhile. Returns whether the data was replaced.
+def refreshRatedCards():
   checkLists()
-  cards = loadCards()
-  tls = loadTierLists()
-  tlmode = CFG.tierlists.mode
-  avg = tlmode == 'average'
-  return RatedCards(cards, tls, avg = avg)
+  with _LOCK:
+    key = snapshotKey()
+    prevkey, current = _LOADED
+    if prevkey == key and current is not None and not current.tls.stale():
+      return False
+    ratedcards = loadSnapshot(key)
+    if ratedcards is None:
+      ratedcards = buildRatedCards()
+    elif ratedcards.tls.stale():
+      ratedcards.refresh()
+    saveSnapshot(key, ratedcards)
+    _install(key, ratedcards, current)
+    return current is not None
+
 
+def buildRatedCards():
+  with stage('loadCards'):
+    cards = loadCards(cls = RatedCard)
+  with stage('loadTierLists'):
+    tls = loadTierLists()
+  with stage('RatedCards'):
+    return RatedCards(cards, tls)
 
 
-def checkLists(force = False):
+
+# With autoupdate False only missing files are fetched, by default the [general] autoupdate setting applies.
+def checkLists(force = False, autoupdate = None):
+  with _FETCHLOCK:
+    _checkLists(force, autoupdate)
+
+
+def _checkLists(force, autoupdate):
+  if autoupdate is None:
+    autoupdate = CFG.general.autoupdate
+  pending = []
   for l in [CFG.cards, CFG.cardids] + CFG.tierlists.lists:
     stype = l.source
     fn = l.filename
     if stype == 'googledocs' or stype == 'uri':
-      try:
-        getCSV(l, autoupdate = CFG.general.autoupdate, force = force)
-      except (IOError, urllib.error.URLError) as err:
-        print('!! Fetching or creating {0} failed. Error: {1}'.format(fn, err), file = sys.stderr)
-        print('!! Bailing. :(', file = sys.stderr)
-        sys.exit(1)
+      if needsUpdate(l, autoupdate = autoupdate, force = force):
+        pending.append(l)
     elif stype == 'local':
       if not os.path.isfile(fn):
         print('!! List {listname} set to local but file {fn} does not exist.'.format(listname = l.name, fn = fn))
@@ -76,3 +139,12 @@ def checkLists(force = False):
       continue
     else:
       print('!! Unknown source {source} for list {listname}.'.format(source = stype, listname = l.name))
+  if not pending:
+    return
+  from .fetch import fetchCSVs
+  errors = fetchCSVs(pending)
+  if errors:
+    for fn, err in errors:
+      print('!! Fetching or creating {0} failed. Error: {1}'.format(fn, err), file = sys.stderr)
+    print('!! Bailing. :(', file = sys.stderr)
+    sys.exit(1)
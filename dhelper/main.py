@@ -3,6 +3,7 @@ import sys
 from .config import loadConfig
 from .modes import getModeHandler
 from .args import parseArgs
+from .timings import stage, startTimings, finishTimings
 
 
 def main():
@@ -12,14 +13,35 @@ def main():
   if handler is None:
     print('!! The impossible happened, no handler for args:', presult, file = sys.stderr)
     sys.exit(1)
-  print('')
+  # --tracemalloc implies --timings, memory is reported per stage.
+  timings = presult.trace or ('-' if presult.timings or presult.tracemalloc else None)
+  if timings is not None:
+    startTimings(memory = presult.tracemalloc)
+  profiler = None
+  if presult.profile:
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+  # Modes writing machine-readable output to stdout skip the blank padding lines.
+  plain = getattr(presult, 'plain', False) or getattr(presult, 'format', 'text') != 'text'
+  if not plain:
+    print('')
   try:
-    handler(presult)
+    with stage(presult.mode):
+      handler(presult)
   except KeyboardInterrupt:
     print('\n\nExit requested from keyboard.')
     sys.exit(0)
-  print('')
+  finally:
+    if profiler is not None:
+      profiler.disable()
+      profiler.dump_stats(presult.profile)
+      print('** Profile written to {0}, view with: python -m pstats {0}'.format(presult.profile), file = sys.stderr)
+    if timings is not None:
+      finishTimings(timings)
+  if not plain:
+    print('')
 
 
 if __name__ == '__main__':
-  main()
\ No newline at end of file
+  main()
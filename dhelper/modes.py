@@ -1,130 +1,190 @@
 __all__ = ['getModeHandler']
 
-import shlex
-import csv
 import os
 import sys
 
-from .output import showTierList, showDeckByCost, mkRatingColor, mkRatingString, mkCardText
-from .args import parseArgs
-from .config import DEFAULTCONFIG, CFG
-from .stats import Stats
-from .filter import FILTERHELP, Filter, FilteredDeck
-from .lists import checkLists, loadRatedCards
-from .deck import DeckCard, loadDeckCards, saveDeckCards
-from .util import COLORCOMBOS
-from .styling import COLORCOLORS, cf
 
+# Handlers import what they need themselves, so a mode only pays for the modules it uses.
+
+_READLINE = []
+def getReadline():
+  if not _READLINE:
+    try:
+      import readline
+    except ImportError:
+      readline = None
+    _READLINE.append(readline)
+  return _READLINE[0]
 
 
-try:
-  import readline
-except ImportError:
-  readline = None
+# Messages for the user, kept out of stdout when it carries records.
+def mkMessageFunc(pargs):
+  if getattr(pargs, 'format', 'text') == 'text':
+    return print
+  return lambda *args, **kwargs: print(*args, file = sys.stderr, **kwargs)
 
 
 def handleDeck(pargs):
+  from .deck import loadDeckCards, saveDeckCards
+  from .filter import FILTERHELP, Filter, FilteredDeck
+  from .lists import loadRatedCards
+  from .output import showTierList, showDeckByCost
+  from .stats import Stats
+  message = mkMessageFunc(pargs)
   filt = Filter()
   costmode = pargs.cost
-  deckfn = pargs.deck
+  deckfns = pargs.deck
   if not costmode and pargs.filter is not None:
     try:
       filt = Filter.fromString(pargs.filter)
     except Exception as err:
-      print('!! Parsing filter failed: ', err)
-      print(FILTERHELP)
+      message('!! Parsing filter failed: ', err)
+      message(FILTERHELP)
       raise
   cards = loadRatedCards()
-  print('Loading deck: {0}'.format(deckfn))
-  deckcards = loadDeckCards(deckfn, cards)
-  if not costmode:
+  message('Loading deck: {0}'.format(', '.join(deckfns)))
+  deckcards = loadDeckCards(deckfns, cards, warn = message)
+  if pargs.format != 'text':
+    from .records import CARDFIELDS, STATSFIELDS, RecordWriter, statsRecord, writeCards
+    fdeck = FilteredDeck.fromDeck(deckcards, filt)
+    with RecordWriter(pargs.format, CARDFIELDS + STATSFIELDS) as writer:
+      writeCards(writer, fdeck)
+      writer.write('stats', statsRecord(Stats(fdeck)))
+  elif not costmode:
     fdeck = showTierList(deckcards, filt)
   else:
     showDeckByCost(deckcards)
     fdeck = FilteredDeck.fromDeck(deckcards)
     print('***  Summary: ', Stats(fdeck).pretty())
   if pargs.write:
-    if pargs.write == deckfn:
-      print('!! Cannot write to the same file as input.')
+    if pargs.write in deckfns:
+      message('!! Cannot write to the same file as input.')
       return
     saveDeckCards(pargs.write, fdeck.deck)
-    print('\nSaved file:', pargs.write)
+    message('\nSaved file:', pargs.write)
+
 
 
+# Draft mode reads card names until the user quits while the data is refreshed in the background.
+def handleDraft(pargs):
+  from .shell import runInShell
+  runInShell(draftSession, pargs)
 
-def handleDraft(_pargs):
+
+def draftSession(pargs):
+  from .deck import DeckCard
+  from .filter import FILTERHELP, Filter, FilteredDeck
+  from .lists import currentRatedCards, loadRatedCards
+  from .output import showTierList, mkRatingColor, mkRatingString, mkCardText
+  from .shell import showNotices
+  from .stats import Stats
+  from .styling import cf
+  readline = getReadline()
   cards = loadRatedCards()
-  lccards = dict((k.lower(),k) for k in cards.keys())
-  lckeys = list(lccards.keys())
+  nameindex = cards.nameindex
+  fmt = getattr(pargs, 'format', 'text')
+  message = mkMessageFunc(pargs)
+  writer = None
+  if fmt != 'text':
+    from .records import CARDFIELDS, STATSFIELDS, RecordWriter, cardRecord, statsRecord, writeCards
+    writer = RecordWriter(fmt, ('set', 'filter') + CARDFIELDS + STATSFIELDS)
+  setno = 1
+
+  # Setstats are the running totals of the set's cards, updated as they are entered.
+  def showSet(deck, setstats, filt = None, filtstr = None):
+    if writer is None:
+      showTierList(deck, filt, stats = setstats)
+    elif deck:
+      fdeck = FilteredDeck.fromDeck(deck, filt or Filter())
+      writeCards(writer, fdeck, set = setno, filter = filtstr)
+      stats = setstats if len(fdeck.deck) == len(deck) else Stats(fdeck)
+      writer.write('stats', statsRecord(stats, set = setno, filter = filtstr))
+
+  def readLine(prompt):
+    showNotices(message)
+    if writer is None:
+      return input(prompt)
+    message(prompt, end = '', flush = True)
+    return input()
 
   if readline is not None:
-    ckeys = cards.keys()
+    completions = []
     def rlcompleterf(line, state):
-      if not line:
-        result = [c for c in ckeys][state]
-      else:
-        result = [c for c in ckeys if c.lower().startswith(line.lower())][state]
-      return result
+      if state == 0:
+        completions[:] = nameindex.complete(line)
+      return completions[state] if state < len(completions) else None
 
     readline.parse_and_bind('tab: complete')
     readline.set_completer_delims('')
     readline.set_completer(rlcompleterf)
 
   deck = {}
-  def findmatches(s):
-    return list(k for k in lckeys if k.find(s) != -1)
-
+  setstats = Stats()
   while True:
     try:
-      line = input('\nEnter card or filter (!help for help): ')
+      line = readLine('\nEnter card or filter (!help for help): ')
     except EOFError:
-      print('')
+      message('')
       break
     if line is None:
       break
+    # Data refreshed in the background meanwhile replaces the old, the set's cards included.
+    current = currentRatedCards()
+    if current is not None and current is not cards:
+      cards = current
+      nameindex = cards.nameindex
+      deck = dict((name, DeckCard.mk(name, cards, count = dcard.count)) for name,dcard in deck.items())
+      deck = dict((name, dcard) for name,dcard in deck.items() if dcard is not None)
+      setstats = Stats(deck.values())
     line = line.strip()
     if line == '':
-      showTierList(deck)
+      showSet(deck, setstats)
       if deck:
-        print('** Starting new set **')
+        message('** Starting new set **')
+        setno += 1
       deck = {}
+      setstats = Stats()
       continue
     if line[0] == '!':
       if line == '!help':
-        print(FILTERHELP)
-        print('A blank filter will show the current cards unfiltered.')
-        print('!q or !quit will exit draft mode.')
+        message(FILTERHELP)
+        message('A blank filter will show the current cards unfiltered.')
+        message('!q or !quit will exit draft mode.')
         continue
       elif line == '!q' or line == '!quit':
         break
       try:
         filt = Filter.fromString(line[1:])
       except ValueError as err:
-        print('! Error: Parsing filter failed: ', err)
+        message('! Error: Parsing filter failed: ', err)
         continue
-      showTierList(deck, filt)
+      showSet(deck, setstats, filt, line[1:])
       continue
     elif line[0] == '#':
       continue
-    matches = findmatches(line.lower())
+    matches = nameindex.search(line)
     if not matches:
-      print('Unknown', line)
-      continue
+      bestname = nameindex.bestMatch(line)
+      if bestname is None:
+        suggestions = nameindex.fuzzy(line)
+        if suggestions:
+          message('Unknown {0}. Did you mean: {1}'.format(line, '; '.join(name for _,name in suggestions)))
+        else:
+          message('Unknown', line)
+        continue
+      message('Assuming:', bestname)
+      cardname = bestname
     elif len(matches) > 1:
       if line not in cards:
-        print('\nAmbiguous:', '; '.join(lccards[n] for n in matches))
-        print('Enter complete name with capitalization for an exact match.')
+        message('\nAmbiguous:', '; '.join(matches))
+        message('Enter complete name with capitalization for an exact match.')
         continue
-      lccardname = line.lower()
+      cardname = line
     else:
-      lccardname = matches[0]
-    cardname = lccards.get(lccardname)
-    if cardname is None:
-      print('Unknown:', line)
-      continue
+      cardname = matches[0]
     deckcard = DeckCard.mk(cardname, cards)
     if deckcard is None:
-      print('Unknown card:', cardname)
+      message('Unknown card:', cardname)
     else:
       c = deckcard.card
       ctext = '^^^ {ctype}{stats}: {text}'.format(
@@ -136,23 +196,38 @@ def handleDraft(_pargs):
         ratingstr = mkRatingString(c.rating) if c.rating >= 0 else '',
         cardstr = mkCardText(deckcard, maxlen = 100), r = cf('{r}'), ratingcol = ratingcol,
         text = ctext)
-    if deckcard.unrated:
-      print('Not in tier list:{0}'.format(output))
+    if writer is not None:
+      writer.write('pick', cardRecord(deckcard, set = setno))
+    elif deckcard.unrated:
+      message('Not in tier list:{0}'.format(output))
     else:
-      print(output)
+      message(output)
+    if cardname in deck:
+      setstats.remove(deck[cardname])
+    setstats.add(deckcard)
     deck[cardname] = deckcard
-  showTierList(deck)
+  showSet(deck, setstats)
+  if writer is not None:
+    writer.close()
 
 
 def handleInteract(_pargs):
-  checkLists()
+  from .shell import runShell
+  runShell(interactSession)
+
+
+# Commands run in a thread, so the shell keeps fetching updates in the background meanwhile.
+async def interactSession(shell):
+  import shlex
+  from .args import parseArgs
+  readline = getReadline()
   while True:
     if readline is not None:
       readline.parse_and_bind('tab: off')
       readline.set_completer_delims('')
       readline.set_completer(None)
     try:
-      line = input('\nDHelper (h for help): ')
+      line = await shell.readLine('\nDHelper (h for help): ')
     except EOFError:
       return
     line = line.strip()
@@ -177,64 +252,343 @@ def handleInteract(_pargs):
     handler = handlers.get(presult.mode)
     if handler is not None:
       print('\n*** Entering {0} mode.\n'.format(presult.mode))
-      handler(presult)
+      await shell.call(handler, presult)
       print('\n*** Exiting {0} mode.\n'.format(presult.mode))
     else:
       print('Unknown command:', args)
 
 
+# On curve influence odds of a quarry deck with its sigils and the best split of the same number
+# of sigils, as (consistency, (best consistency, {color: sigils})). (None, None) without cards to cast.
+def deckInfluence(qdeck):
+  from .influence import InfluenceCalc, powerSources, suggestPowerBase
+  from .util import COLORBITS
+  sources = powerSources(qdeck.deckcards)
+  for c, count in qdeck.sigils.items():
+    sources[COLORBITS[c]] += count
+  consistency = InfluenceCalc(qdeck.size, sources).consistency(qdeck.deckcards)
+  best = suggestPowerBase(qdeck.deckcards, qdeck.colors, qdeck.power, top = 1)
+  if consistency is None or not best:
+    return None, None
+  return consistency, best[0]
+
+
 def handleQuarry(pargs):
-  deckfn = pargs.deck
+  from .config import CFG
+  from .deck import DeckCard, loadDeckCards, saveDeckCards
+  from .deckview import DeckView
+  from .filter import Filter, FilteredDeck
+  from .lists import loadRatedCards
+  from .output import showTierList, showDeckByCost
+  from .quarry import QuarryEngine
+  from .styling import COLORCOLORS, cf
+  from .timings import stage
+  from .util import CTOFACTION, MASKNEUTRAL
+  message = mkMessageFunc(pargs)
+  deckfns = pargs.deck
+  # Decks written with --write are named after the first input.
+  deckfn = 'stdin' if deckfns[0] == '-' else deckfns[0]
   cards = loadRatedCards()
-  print('Loading deck: {0}'.format(deckfn))
-  deckcards = loadDeckCards(deckfn, cards)
-  seen = set()
+  message('Loading deck: {0}'.format(', '.join(deckfns)))
+  deckcards = loadDeckCards(deckfns, cards, warn = message)
+  userfilt = Filter.fromString(pargs.filter) if pargs.filter else None
+  with stage('QuarryEngine'):
+    engine = QuarryEngine(deckcards, userfilt, unknownscore = pargs.unknownscore)
+  qcfg = CFG.modes.quarry
+  writer = None
+  if pargs.format != 'text':
+    from .records import CARDFIELDS, QUARRYFIELDS, STATSFIELDS, RecordWriter, statsRecord, writeCards
+    writer = RecordWriter(pargs.format, ('colors',) + STATSFIELDS + QUARRYFIELDS + CARDFIELDS)
+  viable = list(engine.viable(maxcolors = pargs.maxcolors, minunits = pargs.units, minplayable = pargs.playable))
+  ranks = dict((colors, rank) for rank,(colors,_,_) in
+    enumerate(sorted(viable, key = lambda i: i[2].avgscore, reverse = True), 1))
   colorscores = []
+  deckscores = []
   fileswritten = []
-  for colors in COLORCOMBOS:
-    if len(colors) > pargs.maxcolors:
-      continue
+  poolview = None
+  for colors, mask, stats in viable:
     filtstr = 'c.n' + colors
     if pargs.filter:
       filtstr += ':' + pargs.filter
-    filt = Filter.fromString(filtstr)
-    fdeck = FilteredDeck.fromDeck(deckcards, filt)
-    namesl = list(set(c.name for c in fdeck.deck if c.card.ctype != 'Power' and c.card.ctype != 'Sigil'))
-    namesl.sort()
-    names = tuple(namesl)
-    if names in seen:
-      continue
-    seen.add(names)
     prettycolors = ''.join('{0}{1}{2}'.format(COLORCOLORS.get(c, ''), c, cf('{r}')) for c in colors)
     padding = ' ' * (5 - len(colors))
-    stats = Stats(fdeck, unknownscore = pargs.unknownscore)
-    if stats.typecounts['Unit'] < pargs.units:
-      continue
-    playablecount = sum(stats.typecounts.get(t, 0) for t in ('Unit', 'Spell', 'Fast Spell', 'Attachment'))
-    if playablecount < pargs.playable:
-      continue
     colorscores.append((stats.avgscore, prettycolors))
-    print(cf('{padding}{colors}{d}:{r} {stats}', colors = prettycolors, padding = padding, stats = stats.pretty()))
+    if writer is None:
+      print(cf('{padding}{colors}{d}:{r} {stats}', colors = prettycolors, padding = padding, stats = stats.pretty()))
+    qdeck = None
+    if pargs.optimize:
+      with stage('optimize'):
+        qdeck = engine.optimize(colors, decksize = pargs.decksize, minunits = pargs.units,
+          minpower = qcfg.minpower, maxpower = qcfg.maxpower)
+      deckscores.append((qdeck.stats.avgscore, prettycolors))
+      if pargs.influence:
+        with stage('influence'):
+          influence = deckInfluence(qdeck)
+    if writer is not None:
+      record = statsRecord(stats, colors = colors, rank = ranks[colors], playable = engine.playable(mask))
+      if qdeck is not None:
+        record.update(deckavgscore = round(qdeck.stats.avgscore, 4), decktotalscore = round(qdeck.stats.totalscore, 4),
+          deckpower = qdeck.power, decksize = qdeck.size, sigils = dict(qdeck.sigils))
+        if pargs.influence and influence[0] is not None:
+          consistency, (bestconsistency, bestsigils) = influence
+          record.update(influence = round(consistency, 4), bestsigils = dict(bestsigils),
+            bestinfluence = round(bestconsistency, 4))
+      writer.write('colors', record)
+    elif qdeck is not None:
+      sigilstr = ' '.join('{0}{1}{2}{3}'.format(count, COLORCOLORS.get(c, ''), c, cf('{r}')) for c,count in qdeck.sigils.items())
+      print(cf('       {d}Deck:{r} {stats}, Power: {fwhite}{power}{r}{d}/{r}{fwhite}{size}{r}{sigils}',
+        stats = qdeck.stats.pretty(), power = qdeck.power, size = qdeck.size,
+        sigils = cf(' {d}(sigils: {r}{0}{d}){r}', sigilstr) if sigilstr else ''))
+      if pargs.influence and influence[0] is not None:
+        consistency, (bestconsistency, bestsigils) = influence
+        beststr = ' '.join('{0}{1}{2}{3}'.format(count, COLORCOLORS.get(c, ''), c, cf('{r}'))
+          for c,count in bestsigils.items() if count)
+        print(cf('       {d}Influence on curve:{r} {fwhite}{0:.1%}{r}', consistency) +
+          (cf(', {fwhite}{0:.1%}{r} with sigils {1}', bestconsistency, beststr)
+            if bestconsistency > consistency + 1e-9 else ''))
     if pargs.write:
-      fn = '{0}.{1}.lst'.format(CFG.modes.quarry.deck, colors)
+      fn = '{0}.{1}.lst'.format(deckfn, colors)
       fileswritten.append(fn)
-      saveDeckCards(fn, fdeck.deck)
+      if qdeck is None:
+        saveDeckCards(fn, engine.cards(mask))
+      else:
+        sigils = (DeckCard.mk('{0} Sigil'.format(CTOFACTION[c]), cards, count = count) for c,count in qdeck.sigils.items())
+        saveDeckCards(fn, qdeck.deckcards + [dcard for dcard in sigils if dcard is not None])
     if pargs.expand or pargs.cost:
+      if qdeck is not None:
+        shown = dict((dcard.name, dcard) for dcard in qdeck.deckcards)
+        showfilt = pargs.filter
+      else:
+        shown = deckcards
+        showfilt = filtstr
+      if writer is not None:
+        writeCards(writer, FilteredDeck.fromDeck(shown, Filter.fromString(showfilt) if showfilt else Filter()),
+          colors = colors)
+        continue
+      if qdeck is None:
+        # The pool is sorted once, each combination takes its cards from the view's mask index.
+        if poolview is None:
+          poolview = DeckView(deckcards)
+        shown = poolview
+        if not pargs.filter:
+          shown = poolview.select(within = mask | MASKNEUTRAL)
+          showfilt = None
       if pargs.cost:
-        showDeckByCost(deckcards, filtstr, padding = '    ')
+        showDeckByCost(shown, showfilt, padding = '    ')
       else:
-        showTierList(deckcards, cardfilter = filt, extratext = False, padding = '    ')
+        showTierList(shown, cardfilter = Filter.fromString(showfilt) if showfilt else None, extratext = False, padding = '    ')
         print()
-  colorscores.sort(key = lambda i: i[0], reverse = True)
-  print('\nScore ranking:',
-    cf(', '.join(
-      cf('{r}{col}{r}{d}({b}{fwhite}{score:.2f}{r}{d}){r}', col = col, score = score)
-      for score,col in colorscores)))
+  if writer is not None:
+    writer.close()
+  else:
+    colorscores.sort(key = lambda i: i[0], reverse = True)
+    print('\nScore ranking:',
+      cf(', '.join(
+        cf('{r}{col}{r}{d}({b}{fwhite}{score:.2f}{r}{d}){r}', col = col, score = score)
+        for score,col in colorscores)))
+    if deckscores:
+      deckscores.sort(key = lambda i: i[0], reverse = True)
+      print('Deck ranking:',
+        cf(', '.join(
+          cf('{r}{col}{r}{d}({b}{fwhite}{score:.2f}{r}{d}){r}', col = col, score = score)
+          for score,col in deckscores)))
   if fileswritten:
-    print('\nCreated files: {0}'.format(', '.join(repr(fn) for fn in fileswritten)))
+    message('\nCreated files: {0}'.format(', '.join(repr(fn) for fn in fileswritten)))
+
+
+# Odds of having each card's influence on curve with the deck's power, or the given sigils instead
+# of the deck's, and the best sigils for other power counts.
+def handleInfluence(pargs):
+  from .config import CFG
+  from .deck import loadDeckCards
+  from .influence import InfluenceCalc, colorSources, deckColors, parseSigils, powerSources, suggestPowerBase
+  from .lists import loadRatedCards
+  from .output import mkCardText, writeLines
+  from .styling import COLORCOLORS, cf
+  from .util import COLORBITS
+  message = mkMessageFunc(pargs)
+  try:
+    sigils = parseSigils(pargs.sigils) if pargs.sigils else None
+  except ValueError as err:
+    message('!! {0}'.format(err))
+    sys.exit(1)
+  cards = loadRatedCards()
+  message('Loading deck: {0}'.format(', '.join(pargs.deck)))
+  deckcards = list(loadDeckCards(pargs.deck, cards, warn = message).values())
+  if sigils is not None:
+    deckcards = [dcard for dcard in deckcards if dcard.card.ctype != 'Sigil']
+  sources = powerSources(deckcards)
+  decksize = sum(dcard.count for dcard in deckcards)
+  power = sum(dcard.count for dcard in deckcards if dcard.card.ctype in ('Power', 'Sigil'))
+  for c, count in (sigils or {}).items():
+    sources[COLORBITS[c]] += count
+    decksize += count
+    power += count
+  calc = InfluenceCalc(decksize, sources, draw = pargs.draw)
+  spells = sorted((dcard for dcard in deckcards if dcard.card.ctype not in ('Power', 'Sigil')),
+    key = lambda dcard: (calc.curveTurn(dcard.card), dcard.name))
+  if not spells:
+    message('!! No cards other than power in the deck.')
+    return
+  consistency = calc.consistency(spells)
+  creqs = sorted(set(dcard.card.creq for dcard in spells), key = lambda creq: (len(creq), creq))
+  colors = deckColors(spells)
+  if pargs.suggest is None:
+    powers = ()
+  else:
+    qcfg = CFG.modes.quarry
+    powers = pargs.suggest or range(qcfg.minpower, qcfg.maxpower + 1)
+  suggestions = [(count, suggestPowerBase(deckcards, colors, count, draw = pargs.draw, top = 1)) for count in powers]
+  sigilText = lambda sigils: ' '.join('{0}{1}{2}{3}'.format(count, COLORCOLORS.get(c, ''), c, cf('{r}'))
+    for c,count in sigils.items() if count)
+
+  if pargs.format != 'text':
+    from .records import CARDFIELDS, INFLUENCEFIELDS, RecordWriter, cardRecord
+    with RecordWriter(pargs.format, INFLUENCEFIELDS + CARDFIELDS) as writer:
+      writer.write('influence', {'decksize': decksize, 'power': power, 'powersources': colorSources(sources),
+        'sigils': sigils, 'consistency': None if consistency is None else round(consistency, 4)})
+      for dcard in spells:
+        chance = calc.onCurve(dcard.card)
+        writer.write('card', cardRecord(dcard, turn = calc.curveTurn(dcard.card),
+          chance = None if chance is None else round(chance, 4)))
+      if pargs.turns > 0:
+        for creq in creqs:
+          chances = calc.chances(creq, pargs.turns)
+          if chances[0] is not None:
+            writer.write('requirement', {'creq': creq, 'chances': [round(chance, 4) for chance in chances]})
+      for count, best in suggestions:
+        for rank, (bestconsistency, bestsigils) in enumerate(best, 1):
+          writer.write('powerbase', {'power': count, 'sigils': bestsigils, 'rank': rank,
+            'consistency': round(bestconsistency, 4)})
+    return
+
+  lines = []
+  sourcestr = ', '.join('{0}{1}{2} {3}'.format(COLORCOLORS.get(c, ''), c, cf('{r}'), count)
+    for c,count in colorSources(sources).items())
+  lines.append(cf('{d}Deck:{r} {fwhite}{size}{r} cards, {fwhite}{power}{r} power {d}({r}sources: {sources}{d}){r}, {play}\n',
+    size = decksize, power = power, sources = sourcestr or 'none', play = 'on the draw' if pargs.draw else 'on the play'))
+  linefmt = cf('{d}T{r}{{0:<2}} {fwhite}{{1:>6}}{r}  {{2}}')
+  for dcard in spells:
+    chance = calc.onCurve(dcard.card)
+    lines.append(linefmt.format(calc.curveTurn(dcard.card), '?' if chance is None else '{0:.1%}'.format(chance),
+      mkCardText(dcard)))
+  if consistency is not None:
+    lines.append(cf('\n{d}On curve:{r} {fwhite}{0:.1%}{r} of the cards other than power', consistency))
+  if pargs.turns > 0:
+    lines.append(cf('\n{d}Influence by turn:{r} ' + ' '.join('{0:>6}'.format('T{0}'.format(turn))
+      for turn in range(1, pargs.turns + 1))))
+    for creq in creqs:
+      chances = calc.chances(creq, pargs.turns)
+      if chances[0] is not None:
+        lines.append('{0:<18} {1}'.format(creq, ' '.join('{0:>6.1%}'.format(chance) for chance in chances)))
+  if suggestions:
+    lines.append(cf('\n{d}Best sigils for{r} {0}{d}:{r}', colors or 'N'))
+    for count, best in suggestions:
+      if best:
+        bestconsistency, bestsigils = best[0]
+        lines.append(cf('  Power {fwhite}{count:>2}{r}: {fwhite}{0:>6.1%}{r} {sigils}', bestconsistency,
+          count = count, sigils = sigilText(bestsigils)))
+  writeLines(lines)
+
+
+def handleQuarryBatch(pargs):
+  import csv
+  import json
+  from .batch import BATCHFIELDS, expandPools, quarryPools
+  from .lists import loadRatedCards
+  from .records import csvValue
+  fns = expandPools(pargs.pools)
+  if not fns:
+    print('!! No pool files matched.', file = sys.stderr)
+    return
+  cards = loadRatedCards()
+  fp = sys.stdout if pargs.output == '-' else open(pargs.output, 'w', encoding = 'utf-8', newline = '')
+  try:
+    if pargs.format == 'csv':
+      cw = csv.DictWriter(fp, fieldnames = BATCHFIELDS)
+      cw.writeheader()
+      writerow = lambda row: cw.writerow(dict((key, csvValue(value)) for key,value in row.items()))
+    else:
+      writerow = lambda row: fp.write(json.dumps(row) + '\n')
+    results = quarryPools(cards, fns, pargs.maxcolors, pargs.units, pargs.playable,
+      filterstr = pargs.filter, unknownscore = pargs.unknownscore, jobs = pargs.jobs)
+    for fn, rows, warnings in results:
+      for warning in warnings:
+        print('{0}: {1}'.format(fn, warning), file = sys.stderr)
+      for row in rows:
+        writerow(row)
+      fp.flush()
+  finally:
+    if fp is not sys.stdout:
+      fp.close()
+
+
+def handleSimulate(pargs):
+  import time
+  from .lists import loadRatedCards
+  from .simulate import simulateDrafts
+  from .styling import cf
+  cards = loadRatedCards()
+  started = time.perf_counter()
+  try:
+    summary, picks = simulateDrafts(cards, pargs.drafts, seed = pargs.seed, strategies = pargs.strategies,
+      players = pargs.players, packs = pargs.packs, sets = pargs.sets, maxcolors = pargs.maxcolors,
+      minunits = pargs.units, unknownscore = pargs.unknownscore, jobs = pargs.jobs)
+  except ValueError as err:
+    print('!! Cannot simulate: {0}'.format(err), file = sys.stderr)
+    sys.exit(1)
+  elapsed = time.perf_counter() - started
+  for strategy, (decks, mean, stdev, units) in summary.items():
+    print(cf('{strategy:>10}{d}:{r} Avg deck score: {fwhite}{mean:.3f}{r} {d}(sd {stdev:.3f}){r}, Units: {fwhite}{units:.1f}{r}, Decks: {decks}',
+      strategy = strategy, mean = mean, stdev = stdev, units = units, decks = decks))
+  print('\n{0} drafts, {1} picks in {2:.2f}s ({3:.0f} picks/s).'.format(pargs.drafts, picks, elapsed,
+    picks / elapsed if elapsed else 0.0))
+
+
+# Bench changes the working directory and loads its own configuration while it runs, which the
+# background refreshes of the interactive shell would pick up.
+def handleBench(pargs):
+  import json
+  from .bench import runBench
+  from .shell import inShell
+  if inShell():
+    print('!! bench cannot run in interactive mode, run it on its own.', file = sys.stderr)
+    return
+  report = runBench(ncards = pargs.cards, poolsizes = pargs.pools, repeat = max(1, pargs.repeat),
+    dirname = pargs.dir, seed = pargs.seed)
+  data = json.dumps(report, indent = 1)
+  if pargs.output == '-':
+    print(data)
+  else:
+    with open(pargs.output, 'w', encoding = 'utf-8') as fp:
+      fp.write(data + '\n')
+
+
+def handleServe(pargs):
+  from .server import serve
+  serve(pargs.host, pargs.port, getModeHandler)
+
+
+def handleClient(pargs):
+  import urllib.error
+  from .server import runRemote
+  try:
+    status = runRemote(pargs.host, pargs.port, pargs.args)
+  except (IOError, urllib.error.URLError) as err:
+    print('!! Could not reach the server at {0}:{1}: {2}'.format(pargs.host, pargs.port, err), file = sys.stderr)
+    print('!! Start one with: dhelper serve', file = sys.stderr)
+    sys.exit(1)
+  if status:
+    sys.exit(status)
+
+
+def handleUpdate(_pargs):
+  from .lists import checkLists
+  checkLists(force = True)
 
 
 def handleMakeConfig(pargs, fn = 'dhelper.cfg'):
+  from .config import DEFAULTCONFIG, CFG
   if os.path.exists(fn) and not pargs.merge:
     print('!! {0} already exists. Remove it if you want a new default config and then run this command again.'.format(fn))
     return
@@ -246,10 +600,18 @@ def handleMakeConfig(pargs, fn = 'dhelper.cfg'):
   print('** Config file created:', fn)
 
 
-def handleDumpTierList(_pargs):
+def handleDumpTierList(pargs):
+  import csv
+  from .lists import loadRatedCards
   cards = loadRatedCards()
+  if getattr(pargs, 'sets', None):
+    cardlist = [card for setid in pargs.sets for card in cards.inSet(setid)]
+    if len(pargs.sets) > 1:
+      cardlist.sort(key = lambda card: card.rating, reverse = True)
+  else:
+    cardlist = cards.values()
   cw = csv.writer(sys.stdout, quoting = csv.QUOTE_NONNUMERIC)
-  for card in cards.values():
+  for card in cardlist:
     if card.sources:
       tr = card.rating
       if tr is not None and isinstance(tr, float):
@@ -267,9 +629,15 @@ def handleDumpTierList(_pargs):
 handlers = {
   'deck': handleDeck,
   'draft': handleDraft,
-  'update': lambda pargs: checkLists(force = True),
+  'update': handleUpdate,
   'interact': handleInteract,
   'quarry': handleQuarry,
+  'quarry-batch': handleQuarryBatch,
+  'influence': handleInfluence,
+  'simulate': handleSimulate,
+  'bench': handleBench,
+  'serve': handleServe,
+  'client': handleClient,
   'makeconfig': handleMakeConfig,
   'dumptierlist': handleDumpTierList,
 }
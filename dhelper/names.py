@@ -0,0 +1,138 @@
+__all__ = ['NameIndex', 'editDistance']
+
+import bisect
+import collections
+
+
+# Optimal string alignment distance (adjacent transpositions count as one edit).
+# Gives up and returns maxdist + 1 as soon as the distance is known to exceed maxdist.
+def editDistance(a, b, maxdist):
+  la, lb = len(a), len(b)
+  if abs(la - lb) > maxdist:
+    return maxdist + 1
+  prevprev = None
+  prev = list(range(lb + 1))
+  for i in range(1, la + 1):
+    ca = a[i - 1]
+    curr = [i] + [0] * lb
+    rowmin = i
+    for j in range(1, lb + 1):
+      cb = b[j - 1]
+      d = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + (ca != cb))
+      if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+        d = min(d, prevprev[j - 2] + 1)
+      curr[j] = d
+      if d < rowmin:
+        rowmin = d
+    if rowmin > maxdist:
+      return maxdist + 1
+    prevprev, prev = prev, curr
+  return prev[lb] if prev[lb] <= maxdist else maxdist + 1
+
+
+class NameIndex(object):
+  # Substring queries are answered from the postings of the query's longest n-grams.
+  NGRAM = 3
+
+  def __init__(self, names):
+    lcnames = dict((name.lower(), name) for name in names)
+    self.lcnames = sorted(lcnames)
+    self.names = [lcnames[lcname] for lcname in self.lcnames]
+    self.ngrams = {}
+    # Names by length, for fuzzy queries too short for the n-gram bound.
+    self.bylength = {}
+    for idx, lcname in enumerate(self.lcnames):
+      self.bylength.setdefault(len(lcname), []).append(idx)
+      grams = set()
+      for size in range(1, self.NGRAM + 1):
+        for pos in range(len(lcname) - size + 1):
+          grams.add(lcname[pos:pos + size])
+      for gram in grams:
+        postings = self.ngrams.get(gram)
+        if postings is None:
+          self.ngrams[gram] = [idx]
+        else:
+          postings.append(idx)
+
+  def __len__(self):
+    return len(self.names)
+
+  def get(self, name, default = None):
+    lcname = name.lower()
+    idx = bisect.bisect_left(self.lcnames, lcname)
+    if idx < len(self.lcnames) and self.lcnames[idx] == lcname:
+      return self.names[idx]
+    return default
+
+  def complete(self, prefix):
+    lcprefix = prefix.lower()
+    lo = bisect.bisect_left(self.lcnames, lcprefix)
+    hi = bisect.bisect_left(self.lcnames, lcprefix + '\U0010ffff', lo)
+    return self.names[lo:hi]
+
+  def search(self, s):
+    s = s.lower()
+    if not s:
+      return list(self.names)
+    size = min(len(s), self.NGRAM)
+    postings = None
+    for pos in range(len(s) - size + 1):
+      candidate = self.ngrams.get(s[pos:pos + size])
+      if candidate is None:
+        return []
+      if postings is None or len(candidate) < len(postings):
+        postings = candidate
+    if len(s) == size:
+      return [self.names[idx] for idx in postings]
+    lcnames = self.lcnames
+    return [self.names[idx] for idx in postings if s in lcnames[idx]]
+
+  @staticmethod
+  def maxDistance(s):
+    return min(3, 1 + len(s) // 5)
+
+  # Returns up to limit (distance, name) pairs ordered best first.
+  # Candidates are names sharing enough n-grams with s, so only a few names are ever compared in full.
+  # Queries too short for that are compared with every name of a length within maxdist.
+  def fuzzy(self, s, limit = 5, maxdist = None):
+    s = s.lower().strip()
+    if not s:
+      return []
+    size = self.NGRAM
+    if maxdist is None:
+      maxdist = self.maxDistance(s)
+    lcnames = self.lcnames
+    # Shared n-grams counted by position: a gram occurring twice in s and in a name counts twice.
+    grams = collections.Counter(s[pos:pos + size] for pos in range(len(s) - size + 1))
+    shared = {}
+    for gram, count in grams.items():
+      for idx in self.ngrams.get(gram, ()):
+        common = count
+        if count > 1:
+          lcname = lcnames[idx]
+          common = min(count, sum(1 for pos in range(len(lcname) - size + 1) if lcname.startswith(gram, pos)))
+        shared[idx] = shared.get(idx, 0) + common
+    # An insertion, deletion or substitution destroys at most NGRAM of the query's positional n-grams,
+    # an adjacent transposition (a single edit for editDistance) NGRAM + 1.
+    mincommon = len(s) - size + 1 - maxdist * (size + 1)
+    if mincommon > 0:
+      candidates = [idx for idx,common in shared.items() if common >= mincommon]
+    else:
+      candidates = [idx for length in range(max(0, len(s) - maxdist), len(s) + maxdist + 1)
+        for idx in self.bylength.get(length, ())]
+    results = []
+    for idx in candidates:
+      dist = editDistance(s, lcnames[idx], maxdist)
+      if dist <= maxdist:
+        results.append((dist, -shared.get(idx, 0), idx))
+    results.sort()
+    return [(dist, self.names[idx]) for dist,_,idx in results[:limit]]
+
+  # Returns the name if the best fuzzy match is strictly closer than every other candidate, otherwise None.
+  def bestMatch(self, s, maxdist = None):
+    results = self.fuzzy(s, limit = 2, maxdist = maxdist)
+    if not results:
+      return None
+    if len(results) > 1 and results[1][0] <= results[0][0]:
+      return None
+    return results[0][1]
@@ -1,11 +1,15 @@
-__all__ = ['mkRatingString', 'mkCardText', 'showRatingList', 'showDeckByCost', 'showTierList']
+__all__ = ['mkRatingString', 'mkCreqText', 'mkCardText', 'writeLines', 'ratingListLines', 'showRatingList',
+  'showDeckByCost', 'tierListLines', 'showTierList']
 
 import itertools
+import sys
 
 from .config import CFG
+from .deckview import COSTBUCKETS, DeckView
 from .filter import Filter, FilteredDeck
 from .styling import RARITYCOLORS, COLORCOLORS, TYPECOLORS, mkRatingColor, cf
 from .stats import Stats
+from .timings import stage
 
 
 def mkRatingString(rating):
@@ -16,6 +20,20 @@ def mkRatingString(rating):
   return '{0:1.2f}'.format(rating)
 
 
+# Card text with the style fragments filled in, leaving the card fields as positional fields.
+_CARDFORMAT = '{d}<{r}{{0}}{{1}}{r}{d}>{r} {d}{{2}}{r}{{3}}{{4}}{r}{d}:{r}{b}{{5}}{r}{{6}}'
+_CREQCACHE = {}
+
+
+def mkCreqText(creq):
+  styles = cf('{r}')
+  key = (creq, styles)
+  result = _CREQCACHE.get(key)
+  if result is None:
+    result = _CREQCACHE[key] = ''.join('{0}{1}{2}'.format(COLORCOLORS.get(c, ''), c, styles) for c in creq)
+  return result
+
+
 def mkCardText(deckcard, padlen = None, maxlen = None):
   if padlen is None:
     padlen = CFG.output.padding
@@ -26,81 +44,125 @@ def mkCardText(deckcard, padlen = None, maxlen = None):
   if card is None:
     return name
   countstr = '' if deckcard.count < 2 else '{0}x'.format(deckcard.count)
-  unstyled = '<{rarity}> {count}{name}:{cost}{creq}'.format(
-    name = name[:maxlen], count = countstr,
-    cost = card.cost, creq = card.creq, rarity = card.rarity)
-  styledcreq = ''.join('{0}{1}{2}'.format(COLORCOLORS.get(c, ''), c, cf('{r}')) for c in card.creq)
+  name = name[:maxlen]
+  cost = str(card.cost)
+  creq = card.creq
+  rarity = card.rarity
   typcolor = TYPECOLORS.get(card.ctype, '') if card.ctype is not None else ''
-  styled = cf('{d}<{r}{rarecol}{rarity}{r}{d}>{r} {d}{count}{r}{typcol}{name}{r}{d}:{r}{b}{cost}{r}{creq}',
-    rarecol = RARITYCOLORS.get(card.rarity, ''), typcol = typcolor,
-    name = name[:maxlen], count = countstr, cost = card.cost, creq = styledcreq, rarity = card.rarity)
-  result = ''.join((styled, ' ' * (padlen - len(unstyled)) if padlen != 0 else ''))
-  return result
+  styled = cf(_CARDFORMAT).format(RARITYCOLORS.get(rarity, ''), rarity, countstr, typcolor, name, cost,
+    mkCreqText(creq))
+  if padlen == 0:
+    return styled
+  # The same text as '<{rarity}> {count}{name}:{cost}{creq}' without styles.
+  unstyledlen = 4 + len(rarity) + len(countstr) + len(name) + len(cost) + len(creq)
+  return styled + ' ' * (padlen - unstyledlen)
 
 
-# Color filter example: 'T,TJ,N'
-def showRatingList(deckcards, extratext = True, padding = ''):
+# Whole tables are formatted into a list of lines and written at once.
+def writeLines(lines):
+  if lines:
+    lines.append('')
+    sys.stdout.write('\n'.join(lines))
+
+
+# Deckcards may be a DeckView, its cards are already in rating order. Stats, if given, are the
+# deckcards' running totals and shown instead of new ones.
+def ratingListLines(deckcards, lines, extratext = True, padding = '', stats = None):
   ratingf = lambda dcard: dcard.card.rating
-  srl = sorted(deckcards, key = ratingf, reverse = True)
+  if isinstance(deckcards, DeckView):
+    srl = deckcards.deck
+  else:
+    srl = sorted(deckcards, key = ratingf, reverse = True)
   gsrl = itertools.groupby(srl, ratingf)
   showncount = 0
+  perline = CFG.output.perline
+  linefmt = cf('{{0}}{{1}}{{2:<5}}{r}{{3}}')
 
   for rating,g in gsrl:
     if rating < 0:
       rating = '?.??'
     g = list(g)
     shownchunk = 0
-    for i in range(0, len(g), CFG.output.perline):
-      cardschunk = g[i:i + CFG.output.perline]
+    for i in range(0, len(g), perline):
+      cardschunk = g[i:i + perline]
       showncount += sum(card.count for card in cardschunk)
       if not cardschunk:
         continue
       shownchunk += 1
-      items = ' | '.join(mkCardText(deckcard) for deckcard in cardschunk)
+      items = ' | '.join([mkCardText(deckcard) for deckcard in cardschunk])
       if shownchunk == 1:
         ratingstr = mkRatingString(rating)
         ratingcol = mkRatingColor(rating)
       else:
         ratingstr = ''
         ratingcol = ''
-      print(cf('{padding}{ratingcol}{ratingstr:<5}{r}{items}',
-         ratingstr = ratingstr, items = items, ratingcol = ratingcol, padding = padding))
+      lines.append(linefmt.format(padding, ratingcol, ratingstr, items))
   if extratext:
-    print()
-    print(Stats(deckcards).pretty())
+    lines.append('')
+    lines.append((Stats(deckcards) if stats is None else stats).pretty())
   return showncount
 
 
+# Color filter example: 'T,TJ,N'
+def showRatingList(deckcards, extratext = True, padding = ''):
+  lines = []
+  showncount = ratingListLines(deckcards, lines, extratext = extratext, padding = padding)
+  writeLines(lines)
+  return showncount
+
+
+# The rating list of each cost bucket with its stats. Deckcards is a dict or a DeckView. The power
+# part of cardfilter, if any, is replaced by the buckets. Cards are filtered and sorted once for
+# the whole listing.
 def showDeckByCost(deckcards, cardfilter = None, padding = ''):
-  for cr in ((-100,0), (1,1), (2,2), (3,3), (4,4), (5,5), (6,6), (7,7),(8,8),(9,9),(10,100)):
-    if cardfilter is None:
-      crfilt = Filter(costrange = cr)
+  lines = []
+  view = deckcards if isinstance(deckcards, DeckView) else DeckView(deckcards)
+  if cardfilter is not None:
+    filt = Filter.fromString(cardfilter)
+    with stage('filter'):
+      view = view.select(Filter(ratinglimit = filt.ratinglimit, colorfilter = filt.colorfilter,
+        allowunknown = filt.allowunknown))
+  for cr, bucket in zip(COSTBUCKETS, view.byCost()):
+    if not bucket:
+      continue
+    with stage('output'):
+      ratingListLines(bucket, lines, extratext = False, padding = padding)
+    if cr[0] == cr[1]:
+      coststr = str(cr[0])
+    elif cr[0] < 1:
+      coststr = '0'
     else:
-      crfiltstr = 'p{0},{1}'.format(*cr)
-      crfilt = Filter.fromString(':'.join((cardfilter, crfiltstr)))
-    fdeck = showTierList(deckcards, cardfilter = crfilt, extratext = False, padding = padding)
-    shown = len(fdeck.deck)
-    if shown > 0:
-      if cr[0] == cr[1]:
-        coststr = str(cr[0])
-      elif cr[0] < 1:
-        coststr = '0'
-      else:
-        coststr = '>{0}'.format(cr[0] - 1)
-      print(cf('{padding}{d}^^^  Power {b}{fwhite}{cost:>2}{r}: {stats}\n\n',
-        cost = coststr, stats = Stats(fdeck).pretty(), padding = padding))
+      coststr = '>{0}'.format(cr[0] - 1)
+    lines.append(cf('{padding}{d}^^^  Power {b}{fwhite}{cost:>2}{r}: {stats}\n\n',
+      cost = coststr, stats = Stats(bucket).pretty(), padding = padding))
+  writeLines(lines)
 
 
-
-def showTierList(deck, cardfilter = None, extratext = True, padding = ''):
+# Stats, if given, are the running totals of deck. They are used when nothing is filtered out.
+def tierListLines(deck, lines, cardfilter = None, extratext = True, padding = '', stats = None):
   if not deck:
     return
   if extratext:
-    print('=' * 20, '\n')
+    lines.append('=' * 20 + ' \n')
   if cardfilter is None:
     cardfilter = Filter()
-  filtdeck = FilteredDeck.fromDeck(deck, cardfilter = cardfilter)
-  showRatingList(filtdeck, extratext = extratext, padding = padding)
+  with stage('filter'):
+    if isinstance(deck, DeckView):
+      filtdeck = deck.select(cardfilter)
+    else:
+      filtdeck = FilteredDeck.fromDeck(deck, cardfilter = cardfilter)
+  with stage('output'):
+    if len(filtdeck.deck) != len(deck):
+      stats = None
+    ratingListLines(filtdeck, lines, extratext = extratext, padding = padding, stats = stats)
   if extratext:
-    print('=' * 20,'\n')
+    lines.append('=' * 20 + ' \n')
+  return filtdeck
+
+
+def showTierList(deck, cardfilter = None, extratext = True, padding = '', stats = None):
+  lines = []
+  filtdeck = tierListLines(deck, lines, cardfilter = cardfilter, extratext = extratext, padding = padding,
+    stats = stats)
+  writeLines(lines)
   return filtdeck
@@ -0,0 +1,224 @@
+__all__ = ['PLAYABLETYPES', 'QuarryDeck', 'QuarryEngine', 'idealPower']
+
+import collections
+import heapq
+import itertools
+
+from .deck import DeckCard
+from .filter import Filter
+from .stats import Stats
+from .records import statsRecord
+from .util import COLORCOMBOS, TYPES, MASKOTHER, MASKNEUTRAL, NUMCOLORMASKS, colorMask
+
+
+PLAYABLETYPES = ('Unit', 'Spell', 'Fast Spell', 'Attachment')
+
+
+# Power for a deck of decksize cards whose non-power cards cost avgcost on average: about a third
+# of the deck, more for expensive decks.
+def idealPower(decksize, avgcost, minpower, maxpower):
+  return max(minpower, min(maxpower, int(round(decksize * 0.3 + 1.5 * avgcost))))
+
+
+def _cardCost(card):
+  cost = card.cost
+  return cost if isinstance(cost, int) else 0
+
+
+# Splits count sigils between colors by the influence the deck's cards require.
+def _splitSigils(colors, deckcards, count):
+  pips = collections.Counter()
+  for dcard in deckcards:
+    for c in dcard.card.creq:
+      if c in colors:
+        pips[c] += dcard.count
+  if not pips:
+    pips = collections.Counter(colors)
+  total = sum(pips.values())
+  shares = dict((c, count * n / total) for c,n in pips.items())
+  sigils = dict((c, int(share)) for c,share in shares.items())
+  left = count - sum(sigils.values())
+  for c in sorted(shares, key = lambda c: shares[c] - sigils[c], reverse = True)[:left]:
+    sigils[c] += 1
+  return dict((c, sigils[c]) for c in colors if sigils.get(c))
+
+
+# A deck built from the cards of one color combination. Sigils maps colors to the number of basic sigils.
+# Targetpower is the power count chosen for the deck's curve, power can be higher when the pool
+# runs out of playable cards.
+class QuarryDeck(object):
+  def __init__(self, colors, deckcards, sigils, stats, targetpower):
+    self.colors = colors
+    self.targetpower = targetpower
+    self.deckcards = deckcards
+    self.sigils = sigils
+    self.stats = stats
+    self.power = stats.typecounts['Power'] + sum(sigils.values())
+    self.size = sum(dcard.count for dcard in deckcards) + sum(sigils.values())
+
+
+# The (mask, mask without one bit) steps of _zeta, one bit at a time.
+_ZETASTEPS = tuple((mask, mask ^ bit) for bit in (1 << n for n in range(NUMCOLORMASKS.bit_length() - 1))
+  for mask in range(NUMCOLORMASKS) if mask & bit)
+
+
+# Subset sums: afterwards arr[mask] is the sum of the original entries for every submask of mask.
+# Plain sums are added in place, the many count arrays of an engine make that worth the special case.
+def _zeta(arr, combine = None):
+  if combine is None:
+    for mask, submask in _ZETASTEPS:
+      arr[mask] += arr[submask]
+  else:
+    for mask, submask in _ZETASTEPS:
+      arr[mask] = combine(arr[mask], arr[submask])
+  return arr
+
+
+# Evaluates every color combination of a pool at once.
+# Each card is reduced to the 5 bit mask of its influence requirement a single time. Per mask partial
+# counts are then summed over submasks, so a combination's totals cover exactly the cards whose
+# requirement fits in its colors (the same cards a c.n<colors> filter would pass). Stats objects are
+# only built for the combinations asked for.
+class QuarryEngine(object):
+  def __init__(self, deckcards, cardfilter = None, unknownscore = None):
+    if cardfilter is None:
+      cardfilter = Filter()
+    self.unknownscore = unknownscore
+    # A color filter supplied by the user replaces the per combination one, like it does in a filter string.
+    colorfree = not cardfilter.colorfilter
+    self.members = []
+    known = [0] * NUMCOLORMASKS
+    unknown = [0] * NUMCOLORMASKS
+    totalscore = [0.0] * NUMCOLORMASKS
+    scored = [0] * NUMCOLORMASKS
+    typecounts = dict((typ, [0] * NUMCOLORMASKS) for typ in TYPES)
+    curves = {}
+    occupied = [0] * NUMCOLORMASKS
+    for dcard in deckcards.values():
+      if not cardfilter.test(dcard):
+        continue
+      card = dcard.card
+      mask = colorMask(card.creq) & ~MASKNEUTRAL if colorfree else 0
+      if mask & MASKOTHER:
+        continue
+      self.members.append((mask, dcard))
+      typ = card.ctype if card.ctype in TYPES else 'Other'
+      if typ == 'Sigil':
+        continue
+      count = dcard.count
+      if typ != 'Power':
+        occupied[mask] = 1 << mask
+        cost = card.cost if isinstance(card.cost, int) else 0
+        costcounts = curves.get(cost)
+        if costcounts is None:
+          costcounts = curves[cost] = [0] * NUMCOLORMASKS
+        costcounts[mask] += count
+      if dcard.unrated:
+        unknown[mask] += count
+        if unknownscore is not None:
+          totalscore[mask] += unknownscore * count
+          scored[mask] += 1
+      else:
+        known[mask] += count
+        totalscore[mask] += card.rating * count
+        scored[mask] += 1
+      typecounts[typ][mask] += count
+    self.known = _zeta(known)
+    self.unknown = _zeta(unknown)
+    self.totalscore = _zeta(totalscore)
+    self.scored = _zeta(scored)
+    self.typecounts = dict((typ, _zeta(counts)) for typ,counts in typecounts.items())
+    # Copies of the cards other than power per cost, one array per cost in the pool.
+    self.curves = dict((cost, _zeta(counts)) for cost,counts in sorted(curves.items()))
+    # Bit m is set when cards other than power with requirement mask m are included. Combinations
+    # with equal signatures contain the same spells and units.
+    self.signatures = _zeta(occupied, lambda a, b: a | b)
+
+  def stats(self, mask):
+    stats = Stats(unknownscore = self.unknownscore)
+    stats.known = self.known[mask]
+    stats.unknown = self.unknown[mask]
+    stats.totalscore = self.totalscore[mask]
+    stats.scored = self.scored[mask]
+    stats.typecounts = dict((typ, counts[mask]) for typ,counts in self.typecounts.items())
+    stats.curve.update(dict((cost, counts[mask]) for cost,counts in self.curves.items() if counts[mask]))
+    return stats
+
+  def cards(self, mask):
+    return [dcard for cmask,dcard in self.members if cmask & ~mask == 0]
+
+  def playable(self, mask):
+    return sum(self.typecounts[typ][mask] for typ in PLAYABLETYPES)
+
+  # The highest rated legal deck from the combination's cards: at least minunits units if the pool
+  # has them and the power count in minpower..maxpower closest to idealPower for the chosen cards.
+  # For a fixed number of slots the best units for the minimum plus the best of everything else is
+  # exact, so only the power counts are searched. Missing cards are made up with sigils.
+  def optimize(self, colors, decksize = 45, minunits = 0, minpower = 15, maxpower = 19):
+    unknownscore = self.unknownscore
+    units, others, power = [], [], []
+    for dcard in self.cards(colorMask(colors)):
+      card = dcard.card
+      typ = card.ctype
+      if typ == 'Sigil' or (typ != 'Power' and typ not in PLAYABLETYPES):
+        continue
+      score = unknownscore if dcard.unrated and unknownscore is not None else card.rating
+      copies = [(score, dcard)] * dcard.count
+      if typ == 'Power':
+        power.extend(copies)
+      elif typ == 'Unit':
+        units.extend(copies)
+      else:
+        others.extend(copies)
+    bykey = lambda entry: -entry[0]
+    units.sort(key = bykey)
+    others.sort(key = bykey)
+    power.sort(key = bykey)
+    # Whatever the number of slots, the picks are a prefix of this order.
+    required = units[:minunits]
+    ordered = required + list(heapq.merge(units[len(required):], others, key = bykey))
+    costsums = list(itertools.accumulate((_cardCost(dcard.card) for _,dcard in ordered), initial = 0))
+    best = None
+    for npower in range(minpower, maxpower + 1):
+      count = min(max(0, decksize - npower), len(ordered))
+      avgcost = costsums[count] / count if count else 0.0
+      miss = abs(idealPower(decksize, avgcost, minpower, maxpower) - npower)
+      if best is None or miss < best[0]:
+        best = (miss, ordered[:count], npower)
+    _, picks, targetpower = best
+    npower = decksize - len(picks)
+    picks += power[:npower]
+    counts = collections.OrderedDict()
+    for _,dcard in picks:
+      counts[dcard] = counts.get(dcard, 0) + 1
+    chosen = [DeckCard(dcard.name, dcard.card, count = count) for dcard,count in counts.items()]
+    sigils = _splitSigils(colors, chosen, npower - min(npower, len(power)))
+    return QuarryDeck(colors, chosen, sigils, Stats(chosen, unknownscore = unknownscore), targetpower)
+
+  # Yields (colors, mask, stats) for each distinct combination meeting the limits, in COLORCOMBOS order.
+  def viable(self, maxcolors = 5, minunits = 0, minplayable = 0):
+    seen = set()
+    for colors in COLORCOMBOS:
+      if len(colors) > maxcolors:
+        continue
+      mask = colorMask(colors)
+      signature = self.signatures[mask]
+      if signature in seen:
+        continue
+      seen.add(signature)
+      if self.typecounts['Unit'][mask] < minunits:
+        continue
+      if self.playable(mask) < minplayable:
+        continue
+      yield colors, mask, self.stats(mask)
+
+  # The viable combinations as flat dicts for machine-readable output, ranked by average score.
+  def rows(self, maxcolors = 5, minunits = 0, minplayable = 0):
+    rows = []
+    for colors, mask, stats in self.viable(maxcolors = maxcolors, minunits = minunits, minplayable = minplayable):
+      row = {'colors': colors}
+      row.update(statsRecord(stats, playable = self.playable(mask)))
+      rows.append(row)
+    for rank, row in enumerate(sorted(rows, key = lambda row: row['avgscore'], reverse = True), 1):
+      row['rank'] = rank
+    return rows
@@ -0,0 +1,108 @@
+__all__ = ['RECORDFORMATS', 'CARDFIELDS', 'STATSFIELDS', 'QUARRYFIELDS', 'INFLUENCEFIELDS', 'RecordWriter', 'cardDict',
+  'cardRecord', 'csvValue', 'statsRecord', 'writeCards']
+
+import csv
+import json
+import sys
+
+
+# Machine-readable alternatives to the text output. Every record has a "record" field saying what it
+# describes (card, stats, colors...), so one stream can mix kinds.
+RECORDFORMATS = ('json', 'csv', 'ndjson')
+
+CARDFIELDS = ('name', 'count', 'rating', 'sources', 'cost', 'creq', 'rarity', 'type', 'setid', 'cardid',
+  'market', 'text')
+STATSFIELDS = ('avgscore', 'totalscore', 'known', 'unknown', 'units', 'spells', 'fastspells', 'attachments', 'power',
+  'curve')
+QUARRYFIELDS = ('rank', 'playable', 'deckavgscore', 'decktotalscore', 'deckpower', 'decksize', 'sigils', 'influence',
+  'bestsigils', 'bestinfluence')
+INFLUENCEFIELDS = ('turn', 'chance', 'chances', 'power', 'decksize', 'powersources', 'sigils', 'consistency', 'rank')
+
+
+# A value as one CSV cell: lists comma separated, dicts as key=value pairs, None empty.
+def csvValue(value):
+  if value is None:
+    return ''
+  if isinstance(value, (list, tuple)):
+    return ','.join(str(item) for item in value)
+  if isinstance(value, dict):
+    return ' '.join('{0}={1}'.format(key, item) for key,item in value.items())
+  return value
+
+
+# Writes records as they come: one JSON document per line (ndjson), CSV rows with the given fields
+# in order (missing ones left empty) or a JSON array written element by element.
+class RecordWriter(object):
+  def __init__(self, fmt, fields, fp = None):
+    if fmt not in RECORDFORMATS:
+      raise ValueError('Unknown record format: {0}'.format(fmt))
+    self.fmt = fmt
+    self.fields = ('record',) + tuple(fields)
+    self.fp = sys.stdout if fp is None else fp
+    self.count = 0
+    self.cw = None
+    if fmt == 'csv':
+      self.cw = csv.writer(self.fp)
+      self.cw.writerow(self.fields)
+    elif fmt == 'json':
+      self.fp.write('[')
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+    return False
+
+  def write(self, record, data):
+    if self.cw is not None:
+      data = dict(data, record = record)
+      self.cw.writerow([csvValue(data.get(field)) for field in self.fields])
+    else:
+      text = json.dumps(dict(record = record, **data))
+      if self.fmt == 'ndjson':
+        self.fp.write(text + '\n')
+      else:
+        self.fp.write((',\n' if self.count else '\n') + text)
+    self.count += 1
+
+  def close(self):
+    if self.fmt == 'json':
+      self.fp.write('\n]\n')
+      self.fmt = None
+    self.fp.flush()
+
+
+def cardDict(card):
+  return {
+    'name': card.name, 'rating': card.rating if card.sources else None,
+    'sources': [tl.name for tl in card.sources],
+    'cost': card.cost, 'creq': card.creq, 'rarity': card.rarity, 'type': card.ctype,
+    'setid': card.setid, 'cardid': card.cardid, 'text': card.text,
+  }
+
+
+def cardRecord(dcard, **extra):
+  record = cardDict(dcard.card)
+  record['count'] = dcard.count
+  record['market'] = dcard.market
+  record.update(extra)
+  return record
+
+
+def statsRecord(stats, **extra):
+  tc = stats.typecounts
+  record = {
+    'avgscore': round(stats.avgscore, 4), 'totalscore': round(stats.totalscore, 4),
+    'known': stats.known, 'unknown': stats.unknown,
+    'units': tc['Unit'], 'spells': tc['Spell'], 'fastspells': tc['Fast Spell'],
+    'attachments': tc['Attachment'], 'power': tc['Power'], 'curve': dict(sorted(stats.curve.items())),
+  }
+  record.update(extra)
+  return record
+
+
+# Writes a card record for each of deckcards, best rated first like the rating lists.
+def writeCards(writer, deckcards, **extra):
+  for dcard in sorted(deckcards, key = lambda dcard: dcard.card.rating, reverse = True):
+    writer.write('card', cardRecord(dcard, **extra))
@@ -0,0 +1,336 @@
+__all__ = ['REMOTEMODES', 'TOKENHEADER', 'tokenFile', 'serve', 'request', 'runRemote']
+
+import contextlib
+import hmac
+import http.server
+import io
+import json
+import os
+import re
+import secrets
+import sys
+import traceback
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .args import parseArgs
+from .config import CFG
+from .deck import DeckCard, parseDeckLines
+from .filter import Filter, FilteredDeck
+from .lists import loadRatedCards
+from .quarry import QuarryEngine
+from .records import cardDict
+from .stats import Stats
+from . import styling
+
+
+# Modes a client may run on the server. Anything reading from the terminal has to stay local.
+REMOTEMODES = ('deck', 'quarry', 'dumptierlist')
+
+_ANSICODE = re.compile('\x1b\\[[0-9;]*m')
+
+# /run needs the token serve writes to tokenFile(port), sent back in this header. Only the user
+# can read the file, so web pages and other users cannot run commands with the user's file access.
+TOKENHEADER = 'X-DHelper-Token'
+
+
+def tokenFile(port):
+  return os.path.join(os.path.expanduser('~'), '.dhelper-server-{0}.token'.format(port))
+
+
+def _writeToken(port):
+  token = secrets.token_hex(16)
+  fn = tokenFile(port)
+  fd = os.open(fn, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+  with os.fdopen(fd, 'w', encoding = 'utf-8') as fp:
+    os.chmod(fn, 0o600)
+    fp.write(token)
+  return token
+
+
+def _readToken(port):
+  try:
+    with open(tokenFile(port), 'r', encoding = 'utf-8') as fp:
+      return fp.read().strip()
+  except IOError:
+    return None
+
+
+class RequestError(Exception):
+  def __init__(self, message, status = 400, **extra):
+    super().__init__(message)
+    self.status = status
+    self.extra = extra
+
+
+def findCard(cards, name):
+  card = cards.get(name)
+  if card is not None:
+    return card
+  nameindex = cards.nameindex
+  matches = nameindex.search(name)
+  if len(matches) == 1:
+    return cards[matches[0]]
+  if not matches:
+    bestname = nameindex.bestMatch(name)
+    if bestname is not None:
+      return cards[bestname]
+    raise RequestError('Unknown card: {0}'.format(name), status = 404,
+      suggestions = [sname for _,sname in nameindex.fuzzy(name)])
+  raise RequestError('Ambiguous card: {0}'.format(name), status = 409, matches = matches)
+
+
+def paramFloat(params, key, default = None):
+  value = params.get(key)
+  if value is None or value == '':
+    return default
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    raise RequestError('Bad number for {0}: {1!r}'.format(key, value))
+
+
+def paramFilter(params):
+  filterstr = params.get('filter')
+  if not filterstr:
+    return None
+  try:
+    return Filter.fromString(filterstr)
+  except ValueError as err:
+    raise RequestError('Bad filter: {0}'.format(err))
+
+
+def paramDeck(cards, params):
+  warnings = []
+  warn = lambda *args: warnings.append(' '.join(str(arg) for arg in args))
+  if 'deck' in params:
+    lines = str(params['deck']).splitlines()
+  elif isinstance(params.get('cards'), dict):
+    lines = []
+    for name, count in params['cards'].items():
+      if isinstance(count, bool) or not isinstance(count, (int, str)) or not str(count).strip().isdigit():
+        raise RequestError('Bad count for {0}: {1!r}'.format(name, count))
+      lines.append('{0} {1} ()'.format(int(count), name))
+  else:
+    raise RequestError('Expected deck (text in Eternal export format) or cards (name to count).')
+  return parseDeckLines(lines, cards, warn = warn), warnings
+
+
+def apiCard(cards, params):
+  name = params.get('name')
+  if not name:
+    raise RequestError('Expected name.')
+  return cardDict(findCard(cards, name))
+
+
+def apiFilter(cards, params):
+  filt = paramFilter(params) or Filter()
+  names = params.get('names')
+  # A list, or a comma separated string as in /filter?names=Torch,Vara.
+  if isinstance(names, str):
+    names = [name.strip() for name in names.split(',') if name.strip()]
+  elif names is not None and (not isinstance(names, list) or not all(isinstance(name, str) for name in names)):
+    raise RequestError('Expected names as a list of strings or a comma separated string.')
+  pool = (findCard(cards, name) for name in names) if names else cards.values()
+  matched = [card for card in pool if filt.test(DeckCard(card.name, card))]
+  matched.sort(key = lambda card: card.rating, reverse = True)
+  return {'cards': [{'name': card.name, 'rating': card.rating if card.sources else None} for card in matched]}
+
+
+def apiDeck(cards, params):
+  deckcards, warnings = paramDeck(cards, params)
+  fdeck = FilteredDeck.fromDeck(deckcards, paramFilter(params) or Filter())
+  stats = Stats(fdeck, unknownscore = paramFloat(params, 'unknownscore'))
+  return {
+    'stats': stats.toDict(),
+    'cards': [dict(cardDict(dcard.card), count = dcard.count) for dcard in fdeck],
+    'warnings': warnings,
+  }
+
+
+def apiQuarry(cards, params):
+  qcfg = CFG.modes.quarry
+  deckcards, warnings = paramDeck(cards, params)
+  engine = QuarryEngine(deckcards, paramFilter(params),
+    unknownscore = paramFloat(params, 'unknownscore', qcfg.unknownscore))
+  rows = engine.rows(maxcolors = int(paramFloat(params, 'maxcolors', qcfg.maxcolors)),
+    minunits = int(paramFloat(params, 'units', qcfg.minunits)),
+    minplayable = int(paramFloat(params, 'playable', qcfg.minplayable)))
+  rows.sort(key = lambda row: row['rank'])
+  return {'ranking': rows, 'warnings': warnings}
+
+
+def apiRun(gethandler, params):
+  args = params.get('args')
+  cwd = params.get('cwd') or os.getcwd()
+  if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+    raise RequestError('Expected args as a list of strings.')
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+    try:
+      pargs = parseArgs(args)
+    except SystemExit:
+      return {'output': output.getvalue(), 'status': 2}
+    if getattr(pargs, 'mode', None) not in REMOTEMODES:
+      raise RequestError('Mode not available remotely: {0}'.format(getattr(pargs, 'mode', None)))
+    # Paths are relative to the client, not the server.
+    for attr in ('deck', 'write'):
+      value = getattr(pargs, attr, None)
+      if isinstance(value, str):
+        setattr(pargs, attr, os.path.join(cwd, value))
+      elif isinstance(value, list):
+        if '-' in value:
+          raise RequestError('Decks cannot be read from stdin remotely.')
+        setattr(pargs, attr, [os.path.join(cwd, fn) for fn in value])
+    status = 0
+    try:
+      gethandler(pargs.mode)(pargs)
+    except SystemExit as err:
+      status = err.code if isinstance(err.code, int) else 1
+    except Exception:
+      # The client gets the traceback, the server keeps running.
+      traceback.print_exc()
+      status = 1
+  return {'output': output.getvalue(), 'status': status}
+
+
+_ROUTES = {
+  '/card': apiCard,
+  '/filter': apiFilter,
+  '/deck': apiDeck,
+  '/quarry': apiQuarry,
+}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+  server_version = 'DHelper'
+  gethandler = None
+  token = None
+  hosts = ()
+
+  # Only Host headers naming the server itself, so pages on other names that resolve to this
+  # address (DNS rebinding) are turned away.
+  def checkHost(self):
+    if self.headers.get('Host', '').lower() in self.hosts:
+      return True
+    self.reply(403, {'error': 'Bad Host header.'})
+    return False
+
+  def do_GET(self):
+    if self.checkHost():
+      self.dispatch({})
+
+  def do_POST(self):
+    if not self.checkHost():
+      return
+    # Browsers send other content types without asking first (no CORS preflight).
+    ctype = self.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+    if ctype != 'application/json':
+      self.reply(415, {'error': 'Expected Content-Type: application/json.'})
+      return
+    try:
+      length = int(self.headers.get('Content-Length') or 0)
+      body = json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+      if not isinstance(body, dict):
+        raise ValueError('Expected a JSON object')
+    except ValueError as err:
+      self.reply(400, {'error': 'Bad request body: {0}'.format(err)})
+      return
+    self.dispatch(body)
+
+  def dispatch(self, body):
+    uri = urllib.parse.urlsplit(self.path)
+    params = dict(urllib.parse.parse_qsl(uri.query))
+    params.update(body)
+    try:
+      if uri.path == '/run':
+        token = self.headers.get(TOKENHEADER, '')
+        if self.command != 'POST' or not hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8')):
+          raise RequestError('Missing or wrong token for /run.', status = 403)
+        result = apiRun(self.gethandler, params)
+      else:
+        route = _ROUTES.get(uri.path)
+        if route is None:
+          raise RequestError('Unknown endpoint: {0}'.format(uri.path), status = 404)
+        # Picks up changed tier lists or cards: the snapshot key is checked on every request.
+        result = route(loadRatedCards(), params)
+    except RequestError as err:
+      self.reply(err.status, dict(error = str(err), **err.extra))
+      return
+    except SystemExit:
+      self.reply(500, {'error': 'Loading the card database failed.'})
+      return
+    except Exception as err:
+      traceback.print_exc()
+      self.reply(500, {'error': 'Internal error: {0!r}'.format(err)})
+      return
+    self.reply(200, result)
+
+  def reply(self, status, obj):
+    data = json.dumps(obj).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, fmt, *args):
+    print('** {0} {1}'.format(self.address_string(), fmt % args), file = sys.__stderr__)
+
+
+# Requests are handled one at a time: handlers print to a redirected stdout, which is process wide.
+def logChanges(names):
+  shown = ', '.join(sorted(names)[:5])
+  more = len(names) - 5
+  print('** Ratings changed for {0} card(s): {1}{2}'.format(len(names), shown, ', ...' if more > 0 else ''),
+    file = sys.__stderr__)
+
+
+def serve(host, port, gethandler):
+  # Output goes to clients, which strip the colors if they are not writing to a terminal.
+  styling.setColors(True)
+  loadRatedCards().subscribe(logChanges)
+  hosts = set('{0}:{1}'.format(name, port) for name in ('localhost', '127.0.0.1', '[::1]', host.lower()))
+  handler = type('Handler', (_Handler,), {'gethandler': staticmethod(gethandler), 'hosts': frozenset(hosts)})
+  httpd = http.server.HTTPServer((host, port), handler)
+  handler.token = _writeToken(port)
+  print('** Serving on http://{0}:{1}/'.format(host, port))
+  try:
+    httpd.serve_forever()
+  finally:
+    httpd.server_close()
+    with contextlib.suppress(OSError):
+      os.remove(tokenFile(port))
+
+
+def request(host, port, path, params = None, timeout = 300, token = None):
+  data = json.dumps(params or {}).encode('utf-8')
+  headers = {'Content-Type': 'application/json'}
+  if token is not None:
+    headers[TOKENHEADER] = token
+  req = urllib.request.Request('http://{0}:{1}{2}'.format(host, port, path), data = data, headers = headers)
+  try:
+    with urllib.request.urlopen(req, timeout = timeout) as resp:
+      return json.loads(resp.read().decode('utf-8'))
+  except urllib.error.HTTPError as err:
+    try:
+      return json.loads(err.read().decode('utf-8'))
+    except ValueError:
+      raise err
+
+
+def runRemote(host, port, args):
+  token = _readToken(port)
+  if token is None:
+    print('!! No server token in {0}, is the server running as this user?'.format(tokenFile(port)), file = sys.stderr)
+    return 1
+  result = request(host, port, '/run', {'args': args, 'cwd': os.getcwd()}, token = token)
+  if 'error' in result:
+    print('!! Server error: {0}'.format(result['error']), file = sys.stderr)
+    return 1
+  output = result['output']
+  if not styling.USECOLORS:
+    output = _ANSICODE.sub('', output)
+  sys.stdout.write(output)
+  return result.get('status', 0)
@@ -0,0 +1,120 @@
+__all__ = ['REFRESHINTERVAL', 'Shell', 'runShell', 'runInShell', 'inShell', 'showNotices']
+
+import asyncio
+import threading
+
+from .lists import refreshRatedCards, setBackgroundUpdates
+
+
+# Seconds between background checks for changed or due card and tier list files.
+REFRESHINTERVAL = 60.0
+
+# The running shell, if any.
+_ACTIVE = []
+
+
+def _setResult(future, result):
+  if not future.done():
+    future.set_result(result)
+
+
+def _setException(future, err):
+  if not future.done():
+    future.set_exception(err)
+
+
+# Runs fn in a daemon thread and returns a future for its result. Daemon threads do not keep the
+# process alive, so leaving the shell never waits for a prompt or a download to finish.
+def inThread(loop, fn, *args):
+  future = loop.create_future()
+  def run():
+    try:
+      result = fn(*args)
+    except BaseException as err:
+      loop.call_soon_threadsafe(_setException, future, err)
+    else:
+      loop.call_soon_threadsafe(_setResult, future, result)
+  threading.Thread(target = run, daemon = True).start()
+  return future
+
+
+# The event loop side of the interactive modes. Prompts and commands run in threads while the loop
+# refreshes the card data in the background. Refreshed data replaces the old in one step (see
+# lists.refreshRatedCards), so a command sees either the old or the new data, never a mix.
+class Shell(object):
+  def __init__(self, loop, interval = REFRESHINTERVAL):
+    self.loop = loop
+    self.interval = interval
+    self.notices = []
+    self.refreshing = None
+
+  # Messages from background tasks, shown before the next prompt rather than in the middle of one.
+  def notice(self, message):
+    self.notices.append(message)
+
+  # Also called from command threads, so notices added meanwhile are kept for the next prompt.
+  def showNotices(self, out = print):
+    while self.notices:
+      out(self.notices.pop(0))
+
+  async def readLine(self, prompt):
+    self.showNotices()
+    return await inThread(self.loop, input, prompt)
+
+  # Runs a blocking function, such as a mode handler, without stopping background refreshes.
+  async def call(self, fn, *args):
+    return await inThread(self.loop, fn, *args)
+
+  # Starts a refresh unless one is already running. Returns its task.
+  def refresh(self):
+    if self.refreshing is None or self.refreshing.done():
+      self.refreshing = self.loop.create_task(self._refresh())
+    return self.refreshing
+
+  async def _refresh(self):
+    try:
+      changed = await inThread(self.loop, refreshRatedCards)
+    except (Exception, SystemExit) as err:
+      self.notice('!! Background update failed: {0}'.format(err))
+      return
+    if changed:
+      self.notice('** Loaded updated cards and tier lists.')
+
+  async def refreshLoop(self):
+    while True:
+      await self.refresh()
+      await asyncio.sleep(self.interval)
+
+
+# Runs the coroutine function session(shell, *args) with background refreshes until it returns.
+def runShell(session, *args, interval = REFRESHINTERVAL):
+  async def main():
+    shell = Shell(asyncio.get_running_loop(), interval = interval)
+    _ACTIVE.append(shell)
+    setBackgroundUpdates(True)
+    refresher = asyncio.ensure_future(shell.refreshLoop())
+    try:
+      return await session(shell, *args)
+    finally:
+      refresher.cancel()
+      setBackgroundUpdates(False)
+      _ACTIVE.remove(shell)
+  return asyncio.run(main())
+
+
+def inShell():
+  return bool(_ACTIVE)
+
+
+# Shows the running shell's notices, for commands that read their own input.
+def showNotices(out = print):
+  if _ACTIVE:
+    _ACTIVE[-1].showNotices(out)
+
+
+# Runs the blocking fn with background refreshes: in a new shell or, when already called from a
+# shell command, directly.
+def runInShell(fn, *args):
+  if _ACTIVE:
+    return fn(*args)
+  return runShell(lambda shell: shell.call(fn, *args))
@@ -0,0 +1,214 @@
+__all__ = ['STRATEGIES', 'PackMaker', 'runDraft', 'simulateDrafts']
+
+import collections
+import concurrent.futures
+import math
+import multiprocessing
+import os
+import random
+
+from .config import loadConfig
+from .deck import DeckCard
+from .lists import loadRatedCards
+from .quarry import QuarryEngine
+from .util import COLORCOMBOS, NUMCOLORMASKS, colorMask
+
+
+# Cards per rarity in a pack. The rare slot is legendary one time in LEGENDARYODDS.
+PACKLAYOUT = (('C', 8), ('U', 3), ('R', 1))
+LEGENDARYODDS = 8
+
+# Picks a committed drafter makes before settling on two colors, and the rating an off color card loses.
+COMMITAFTER = 8
+OFFCOLORPENALTY = 1.5
+
+
+# Generates random packs from the non-sigil cards of the given sets (all by default).
+class PackMaker(object):
+  def __init__(self, cards, sets = None):
+    byrarity = collections.defaultdict(list)
+    for card in cards.values():
+      if card.ctype == 'Sigil' or (sets and card.setid not in sets):
+        continue
+      byrarity[card.rarity].append((card, colorMask(card.creq) & (NUMCOLORMASKS - 1)))
+    if not byrarity:
+      raise ValueError('No cards to make packs from')
+    fallback = byrarity.get('C') or next(iter(byrarity.values()))
+    self.slots = []
+    for rarity, count in PACKLAYOUT:
+      self.slots.append((byrarity.get(rarity) or fallback, count))
+    self.legendaries = byrarity.get('L')
+
+  def make(self, rng):
+    pack = []
+    for pool, count in self.slots:
+      pack += rng.sample(pool, count) if len(pool) >= count else [rng.choice(pool) for _ in range(count)]
+    if self.legendaries and rng.randrange(LEGENDARYODDS) == 0:
+      pack[-1] = rng.choice(self.legendaries)
+    return pack
+
+
+class Drafter(object):
+  __slots__ = ('strategy', 'picks', 'colorscores', 'colors')
+
+  def __init__(self, strategy):
+    self.strategy = strategy
+    self.picks = []
+    self.colorscores = [0.0] * (NUMCOLORMASKS.bit_length() - 1)
+    self.colors = None
+
+  def take(self, entry):
+    self.picks.append(entry)
+    card, mask = entry
+    if card.rating > 0:
+      bit = 0
+      while mask >> bit:
+        if mask >> bit & 1:
+          self.colorscores[bit] += card.rating
+        bit += 1
+
+
+def pickRating(pack, drafter, rng):
+  return max(range(len(pack)), key = lambda idx: pack[idx][0].rating)
+
+
+def pickRandom(pack, drafter, rng):
+  return rng.randrange(len(pack))
+
+
+# Takes the best card until COMMITAFTER picks, then favors the two colors its picks are strongest in.
+def pickCommitted(pack, drafter, rng):
+  if len(drafter.picks) < COMMITAFTER:
+    return pickRating(pack, drafter, rng)
+  if drafter.colors is None:
+    scores = drafter.colorscores
+    top = sorted(range(len(scores)), key = lambda bit: scores[bit], reverse = True)[:2]
+    drafter.colors = sum(1 << bit for bit in top)
+  offcolor = ~drafter.colors
+  return max(range(len(pack)),
+    key = lambda idx: pack[idx][0].rating - (OFFCOLORPENALTY if pack[idx][1] & offcolor else 0.0))
+
+
+STRATEGIES = collections.OrderedDict((
+  ('rating', pickRating),
+  ('committed', pickCommitted),
+  ('random', pickRandom),
+))
+
+
+# Scores the best deck a drafter can build from their picks: the average rating over the slots left
+# for cards other than power, with slots the picks cannot fill counting as 0. Returns (score, Stats).
+def scoreDrafter(drafter, maxcolors = 2, minunits = 0, unknownscore = None, decksize = 45):
+  counts = collections.Counter(card.name for card,_ in drafter.picks)
+  cards = dict((card.name, card) for card,_ in drafter.picks)
+  deckcards = dict((name, DeckCard(name, cards[name], count = count)) for name,count in counts.items())
+  engine = QuarryEngine(deckcards, unknownscore = unknownscore)
+  best = None
+  for colors in COLORCOMBOS:
+    if len(colors) > maxcolors:
+      continue
+    qdeck = engine.optimize(colors, decksize = decksize, minunits = minunits)
+    total = 0.0
+    for dcard in qdeck.deckcards:
+      if dcard.card.ctype == 'Power':
+        continue
+      rating = (unknownscore or 0.0) if dcard.unrated else dcard.card.rating
+      total += rating * dcard.count
+    score = total / max(1, decksize - qdeck.targetpower)
+    if best is None or score > best[0]:
+      best = (score, qdeck.stats)
+  return best
+
+
+# Runs one draft: every player opens a pack, picks from it and passes it on, alternating
+# direction with each round. Returns the drafters in seat order.
+def runDraft(packmaker, strategies, rng, players = 8, packs = 4):
+  drafters = [Drafter(strategies[seat % len(strategies)]) for seat in range(players)]
+  for packno in range(packs):
+    hands = [packmaker.make(rng) for _ in drafters]
+    while hands[0]:
+      for drafter, hand in zip(drafters, hands):
+        drafter.take(hand.pop(STRATEGIES[drafter.strategy](hand, drafter, rng)))
+      hands = hands[-1:] + hands[:-1] if packno % 2 == 0 else hands[1:] + hands[:1]
+  return drafters
+
+
+# The card database and pack maker for this process. Forked workers inherit the parent's cards.
+_CARDS = None
+_PACKMAKERS = {}
+
+
+def _initWorker():
+  global _CARDS
+  if _CARDS is None:
+    loadConfig()
+    _CARDS = loadRatedCards()
+
+
+def _packMaker(sets):
+  packmaker = _PACKMAKERS.get(sets)
+  if packmaker is None:
+    packmaker = _PACKMAKERS[sets] = PackMaker(_CARDS, sets)
+  return packmaker
+
+
+# Runs drafts first..last-1. Draft n is seeded with (seed, n) and seats rotate with n, so results do
+# not depend on how the drafts are split between processes. Returns {strategy: [count, sum, sum of
+# squares, units]} for the deck scores and the number of picks made.
+def _simulateRange(args):
+  first, last, seed, strategies, players, packs, sets, maxcolors, minunits, unknownscore = args
+  packmaker = _packMaker(sets)
+  totals = dict((strategy, [0, 0.0, 0.0, 0]) for strategy in strategies)
+  picks = 0
+  for draftno in range(first, last):
+    rng = random.Random(seed * 1000003 + draftno)
+    shift = draftno % len(strategies)
+    drafters = runDraft(packmaker, strategies[shift:] + strategies[:shift], rng, players = players, packs = packs)
+    for drafter in drafters:
+      picks += len(drafter.picks)
+      score, stats = scoreDrafter(drafter, maxcolors = maxcolors, minunits = minunits, unknownscore = unknownscore)
+      total = totals[drafter.strategy]
+      total[0] += 1
+      total[1] += score
+      total[2] += score ** 2
+      total[3] += stats.typecounts['Unit']
+  return totals, picks
+
+
+# Returns ({strategy: (decks, mean score, standard deviation, mean units)}, picks).
+def simulateDrafts(cards, drafts, seed = 0, strategies = ('rating', 'committed'), players = 8, packs = 4,
+    sets = None, maxcolors = 2, minunits = 0, unknownscore = None, jobs = None):
+  global _CARDS
+  if drafts < 1:
+    return collections.OrderedDict(), 0
+  _CARDS = cards
+  strategies = list(strategies)
+  sets = tuple(sorted(sets)) if sets else None
+  _packMaker(sets)
+  if jobs is None:
+    jobs = os.cpu_count() or 1
+  jobs = max(1, min(jobs, drafts))
+  chunks = min(drafts, jobs * 4)
+  bounds = [drafts * idx // chunks for idx in range(chunks + 1)]
+  argslist = [(bounds[idx], bounds[idx + 1], seed, strategies, players, packs, sets, maxcolors, minunits, unknownscore)
+    for idx in range(chunks)]
+  if jobs == 1:
+    results = list(map(_simulateRange, argslist))
+  else:
+    if 'fork' in multiprocessing.get_all_start_methods():
+      mpcontext = multiprocessing.get_context('fork')
+    else:
+      mpcontext = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers = jobs, mp_context = mpcontext,
+        initializer = _initWorker) as executor:
+      results = list(executor.map(_simulateRange, argslist))
+  summary = collections.OrderedDict()
+  picks = 0
+  for strategy in strategies:
+    count, total, squares, units = (sum(totals[strategy][idx] for totals,_ in results) for idx in range(4))
+    if count:
+      mean = total / count
+      summary[strategy] = (count, mean, math.sqrt(max(0.0, squares / count - mean ** 2)), units / count)
+  for _,rpicks in results:
+    picks += rpicks
+  return summary, picks
@@ -0,0 +1,55 @@
+__all__ = ['snapshotKey', 'loadSnapshot', 'saveSnapshot']
+
+import hashlib
+import os
+import pickle
+import sys
+
+from .config import CFG
+from .util import atomicWrite
+
+
+# Bump this when the layout of any pickled class changes.
+_SNAPSHOTVERSION = 8
+
+
+# Tier list files are not part of the key. Each list remembers the stat of the file it was
+# loaded from, and RatedCards.refresh reloads the ones that changed.
+def snapshotKey():
+  h = hashlib.sha1()
+  h.update('dhelper-snapshot-{0}\n'.format(_SNAPSHOTVERSION).encode('utf-8'))
+  for l in [CFG.cards, CFG.cardids]:
+    st = os.stat(l.filename)
+    h.update('{0}\0{1}\0{2}\0{3}\n'.format(l.name, l.filename, st.st_mtime_ns, st.st_size).encode('utf-8'))
+  pcfg = CFG.pcfg
+  for secname in ['tierlists'] + CFG.tierlists.use:
+    h.update('[{0}]\n'.format(secname).encode('utf-8'))
+    for k,v in sorted(pcfg[secname].items()):
+      h.update('{0}={1}\n'.format(k, v).encode('utf-8'))
+  return h.hexdigest()
+
+
+def loadSnapshot(key, fn = None):
+  if fn is None:
+    fn = CFG.general.snapshot
+  if fn is None or not os.path.isfile(fn):
+    return None
+  try:
+    with open(fn, 'rb') as fp:
+      if fp.readline().rstrip(b'\n').decode('ascii', 'replace') != key:
+        return None
+      return pickle.load(fp)
+  except Exception:
+    # A stale or damaged snapshot just means we parse the CSVs again.
+    return None
+
+
+def saveSnapshot(key, ratedcards, fn = None):
+  if fn is None:
+    fn = CFG.general.snapshot
+  if fn is None:
+    return
+  try:
+    atomicWrite(fn, (key.encode('ascii') + b'\n', pickle.dumps(ratedcards, protocol = pickle.HIGHEST_PROTOCOL)))
+  except (IOError, OSError, pickle.PicklingError) as err:
+    print('!! Could not write snapshot {0}: {1}'.format(fn, err), file = sys.stderr)
@@ -1,44 +1,85 @@
 __all__ = ['Stats']
 
+import collections
+
 from .styling import cf, TYPECOLORS
+from .timings import stage
 from .util import TYPES
 
+# Running totals of a deck: card counts by rating status and type, scores and the mana curve.
+# Cards can be added and removed one at a time and partial totals merged, so live decks never
+# need a rescan. The average score is per distinct scored card.
 class Stats(object):
-  def __init__(self, deck, unknownscore = None):
-    self.__reset()
-    self.__analyze(deck, unknownscore = unknownscore)
-
-  def __reset(self):
+  def __init__(self, deck = (), unknownscore = None):
+    self.unknownscore = unknownscore
     self.known = 0
     self.unknown = 0
     self.typecounts = dict((t,0) for t in TYPES)
-    self.avgscore = 0.0
     self.totalscore = 0.0
+    self.scored = 0
+    # Copies per power cost of the cards other than power, '*' costs counted as 0.
+    self.curve = collections.Counter()
+    with stage('Stats'):
+      for dcard in deck:
+        self.add(dcard)
 
-  def __analyze(self, deck, unknownscore = None):
-    self.totalscore = 0.0
-    count = 0
-    for dcard in deck:
-      card = dcard.card
-      typ = card.ctype if card.ctype in TYPES else 'Other'
-      if typ == 'Sigil':
-        continue
-      if dcard.unrated:
-        self.unknown += dcard.count
-      else:
-        self.known += dcard.count
-      if not dcard.unrated:
-        self.totalscore += card.rating * dcard.count
-        count += 1
-      elif unknownscore is not None:
-        self.totalscore += unknownscore * dcard.count
-        count += 1
-      tcount = self.typecounts.get(typ, 0)
-      self.typecounts[typ] = tcount + dcard.count
-    if count:
-      self.avgscore = self.totalscore / count
+  @property
+  def avgscore(self):
+    return self.totalscore / self.scored if self.scored else 0.0
+
+  def add(self, dcard):
+    self._count(dcard, 1)
+
+  def remove(self, dcard):
+    self._count(dcard, -1)
+
+  def _count(self, dcard, sign):
+    card = dcard.card
+    typ = card.ctype
+    if typ == 'Sigil':
+      return
+    if typ not in TYPES:
+      typ = 'Other'
+    count = dcard.count * sign
+    if not dcard.unrated:
+      self.known += count
+      self.totalscore += card.rating * count
+      self.scored += sign
     else:
-      self.avgscore = 0.0
+      self.unknown += count
+      if self.unknownscore is not None:
+        self.totalscore += self.unknownscore * count
+        self.scored += sign
+    self.typecounts[typ] += count
+    if typ != 'Power':
+      cost = card.cost if isinstance(card.cost, int) else 0
+      curve = self.curve
+      left = curve.get(cost, 0) + count
+      if left:
+        curve[cost] = left
+      else:
+        del curve[cost]
+
+  # Adds the totals of other, which must use the same unknown score.
+  def merge(self, other):
+    self.known += other.known
+    self.unknown += other.unknown
+    for typ, count in other.typecounts.items():
+      self.typecounts[typ] = self.typecounts.get(typ, 0) + count
+    self.totalscore += other.totalscore
+    self.scored += other.scored
+    self.curve.update(other.curve)
+    return self
+
+  def copy(self):
+    return Stats(unknownscore = self.unknownscore).merge(self)
+
+  def toDict(self):
+    return {
+      'avgscore': self.avgscore, 'totalscore': self.totalscore,
+      'known': self.known, 'unknown': self.unknown,
+      'typecounts': dict(self.typecounts), 'curve': dict(sorted(self.curve.items())),
+    }
 
   def pretty(self):
     tns = ('Unit', 'Spell', 'Fast Spell', 'Attachment', 'Power')
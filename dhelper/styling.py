@@ -1,97 +1,127 @@
-__all__ = ['HAVECOLORS', 'STYLES', 'COLORCOLORS', 'RARITYCOLORS', 'TYPECOLORS', 'cf', 'mkRatingColor']
+__all__ = ['HAVECOLORS', 'USECOLORS', 'STYLES', 'COLORCOLORS', 'RARITYCOLORS', 'TYPECOLORS', 'cf', 'mkRatingColor',
+  'setColors']
 
-Fore = None
-Back = None
-Style = None
-HAVECOLORS = False
-
-try:
-  import colorama
-  colorama.init(autoreset = True)
-  Fore = colorama.Fore
-  Back = colorama.Back
-  Style = colorama.Style
-  HAVECOLORS = True
-except ImportError:
-  class ColDummy(object):
-    def __getattr__(self, key):
-      if key and isinstance(key, str) and key[0] != '_':
-        return ''
-      raise AttributeError('ColDummy: Not here')
-  Fore = ColDummy()
-  Back = ColDummy()
-  Style = ColDummy()
-
-
-STYLES = {
-  'r': Style.RESET_ALL,
-  'd': Style.DIM,
-  'b': Style.BRIGHT,
-  'n': Style.NORMAL,
-  'fblack': Fore.BLACK,
-  'fred': Fore.RED,
-  'fgreen': Fore.GREEN,
-  'fyellow': Fore.YELLOW,
-  'fblue': Fore.BLUE,
-  'fmagenta': Fore.MAGENTA,
-  'fcyan': Fore.CYAN,
-  'fwhite': Fore.WHITE,
-  'bblack': Back.BLACK,
-  'bred': Back.RED,
-  'bgreen': Back.GREEN,
-  'byellow': Back.YELLOW,
-  'bblue': Back.BLUE,
-  'bmagenta': Back.MAGENTA,
-  'bcyan': Back.CYAN,
-  'bwhite': Back.WHITE,
-}
+import sys
 
-def cf(fmt, *args, **fkwargs):
-  kwargs = { **fkwargs, **STYLES }
-  return fmt.format(*args, **kwargs)
+# HAVECOLORS: colorama is available. USECOLORS: styles are currently filled in, see setColors.
+HAVECOLORS = False
+USECOLORS = False
 
+_STYLENAMES = (
+  ('r', 'Style', 'RESET_ALL'),
+  ('d', 'Style', 'DIM'),
+  ('b', 'Style', 'BRIGHT'),
+  ('n', 'Style', 'NORMAL'),
+)
+_COLORNAMES = ('black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white')
 
-RARITYCOLORS = {
-  'C': Style.NORMAL + Fore.WHITE,
-  'U': Style.BRIGHT + Fore.GREEN,
-  'P': Style.BRIGHT + Fore.MAGENTA,
-  'R': Style.BRIGHT + Fore.BLUE,
-  'L': Style.BRIGHT + Fore.YELLOW
+RARITYSTYLES = {
+  'C': '{n}{fwhite}',
+  'U': '{b}{fgreen}',
+  'P': '{b}{fmagenta}',
+  'R': '{b}{fblue}',
+  'L': '{b}{fyellow}',
 }
 
-COLORCOLORS = {
-  'F': Style.NORMAL + Fore.RED,
-  'T': Style.NORMAL + Fore.YELLOW,
-  'J': Style.NORMAL + Fore.GREEN,
-  'P': Style.NORMAL + Fore.BLUE,
-  'S': Style.NORMAL + Fore.MAGENTA
+COLORSTYLES = {
+  'F': '{n}{fred}',
+  'T': '{n}{fyellow}',
+  'J': '{n}{fgreen}',
+  'P': '{n}{fblue}',
+  'S': '{n}{fmagenta}',
 }
 
-TYPECOLORS = {
-  'Unit': Style.RESET_ALL,
-  'Attachment': Style.BRIGHT + Fore.WHITE,
-  'Spell': Style.NORMAL + Fore.CYAN,
-  'Fast Spell': Style.BRIGHT + Fore.CYAN,
-  'Power': Style.NORMAL + Fore.YELLOW,
-  'Sigil': Style.DIM + Fore.YELLOW
+TYPESTYLES = {
+  'Unit': '{r}',
+  'Attachment': '{b}{fwhite}',
+  'Spell': '{n}{fcyan}',
+  'Fast Spell': '{b}{fcyan}',
+  'Power': '{n}{fyellow}',
+  'Sigil': '{d}{fyellow}',
 }
 
+# Lower bounds and styles for mkRatingColor, best first.
+RATINGSTYLES = (
+  (3.5, '{b}{fgreen}'),
+  (3.0, '{n}{fgreen}'),
+  (2.5, '{d}{fgreen}'),
+  (2.0, '{n}{fyellow}'),
+  (1.5, '{b}{fyellow}'),
+  (1.0, '{d}{fred}'),
+  (0.5, '{n}{fred}'),
+)
+
+# Filled in by setColors. The dicts are updated in place, so modules importing them see changes.
+STYLES = {}
+RARITYCOLORS = {}
+COLORCOLORS = {}
+TYPECOLORS = {}
+_RATINGCOLORS = []
+_CFCACHE = {}
+
+
+# Looks up names missing from the format arguments in STYLES, without copying either.
+class _StyleArgs(dict):
+  __slots__ = ()
+
+  def __missing__(self, key):
+    return STYLES[key]
+
+
+# Formats fmt with the style names ({r}, {d}, {fred}...) available. Results of calls with only
+# style names are cached, so use cf('{r}') freely.
+def cf(fmt, *args, **fkwargs):
+  if args:
+    return fmt.format(*args, **{ **fkwargs, **STYLES })
+  if fkwargs:
+    return fmt.format_map(_StyleArgs(fkwargs))
+  result = _CFCACHE.get(fmt)
+  if result is None:
+    result = _CFCACHE[fmt] = fmt.format_map(STYLES)
+  return result
+
+
+# With colors off every style is an empty string, which makes for plain text output. Colors need
+# colorama, without it they stay off. Returns whether colors are on.
+def setColors(enabled):
+  global HAVECOLORS, USECOLORS
+  codes = None
+  if enabled:
+    try:
+      import colorama
+    except ImportError:
+      colorama = None
+    if colorama is not None:
+      HAVECOLORS = True
+      if not USECOLORS and sys.stdout.isatty():
+        colorama.init(autoreset = True)
+      codes = dict((key, getattr(getattr(colorama, cls), attr)) for key,cls,attr in _STYLENAMES)
+      for color in _COLORNAMES:
+        codes['f' + color] = getattr(colorama.Fore, color.upper())
+        codes['b' + color] = getattr(colorama.Back, color.upper())
+  if codes is None:
+    codes = dict((key, '') for key,_,_ in _STYLENAMES)
+    for color in _COLORNAMES:
+      codes['f' + color] = codes['b' + color] = ''
+  USECOLORS = codes['r'] != ''
+  STYLES.clear()
+  STYLES.update(codes)
+  _CFCACHE.clear()
+  for styled, styles in ((RARITYCOLORS, RARITYSTYLES), (COLORCOLORS, COLORSTYLES), (TYPECOLORS, TYPESTYLES)):
+    styled.clear()
+    styled.update((key, cf(fmt)) for key,fmt in styles.items())
+  _RATINGCOLORS[:] = [(bound, cf(fmt)) for bound,fmt in RATINGSTYLES]
+  return USECOLORS
+
 
 def mkRatingColor(rating):
   if not isinstance(rating, float):
     return ''
-  if rating > 3.5:
-    return cf('{b}{fgreen}')
-  elif rating > 3:
-    return cf('{n}{fgreen}')
-  elif rating > 2.5:
-    return cf('{d}{fgreen}')
-  elif rating > 2:
-    return cf('{n}{fyellow}')
-  elif rating > 1.5:
-    return cf('{b}{fyellow}')
-  elif rating > 1:
-    return cf('{d}{fred}')
-  elif rating > 0.5:
-    return cf('{n}{fred}')
-  return cf('{b}{fred}')
+  for bound, color in _RATINGCOLORS:
+    if rating > bound:
+      return color
+  return STYLES['b'] + STYLES['fred']
+
+
+# Colors are only written to a terminal. Piped output is plain text, which colorama would strip anyway.
+setColors(sys.stdout.isatty())
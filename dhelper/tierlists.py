@@ -1,18 +1,66 @@
-__all__ = ['loadTierLists']
+__all__ = ['TIERLISTFORMATS', 'TierList', 'registerTierListFormat', 'loadTierLists']
 
+import array
 import collections
 import csv
-
+import datetime
+import importlib
+import json
+import math
+import os
+import sys
+
+from .aggregate import AGGREGATEMODES, normalizeColumns, aggregateRatings
 from .config import CFG
 from .cards import Card
+from .names import NameIndex
 from .util import FACTIONS, CRESTS, fixCardName
 
 
+_NORATING = float('nan')
+
+
+def _parseDate(value):
+  return datetime.datetime.strptime(value.strip(), '%Y-%m-%d').timestamp()
+
+
+# Ratings are kept in a flat array of floats indexed by name id, NaN meaning not rated. Lists
+# registered with the same TierLists share one name to id mapping.
 class TierList(object):
-  def __init__(self, tlcfg):
+  def __init__(self, tlcfg, names = None):
     self.name = tlcfg.name
     self.cfg = tlcfg
-    self.tl = {}
+    self.names = {} if names is None else names
+    self.ratings = array.array('d')
+    self.count = 0
+    self.stamp = None
+    self.weight = self.option('weight', float, 1.0)
+    if self.weight < 0:
+      raise ValueError('TierList {0}: Weight may not be negative'.format(self.name))
+    # When the list was last updated, for the recency decay: the date option (YYYY-MM-DD) if set,
+    # otherwise the modification time of the file, which downloads only rewrite when it changed.
+    self.date = self.option('date', _parseDate) if 'date' in self.cfg.options else None
+
+  def setRating(self, name, rating):
+    if self._storeRating(self.ratings, name, rating):
+      self.count += 1
+
+  # Stores rating for name in ratings, replacing an earlier rating of the name. Returns True for a
+  # name not rated in ratings before.
+  def _storeRating(self, ratings, name, rating):
+    names = self.names
+    idx = names.get(name)
+    if idx is None:
+      name = sys.intern(name)
+      idx = names[name] = len(names)
+    missing = idx + 1 - len(ratings)
+    if missing > 0:
+      ratings.extend(array.array('d', (_NORATING,)) * missing)
+    elif not math.isnan(ratings[idx]):
+      ratings[idx] = rating
+      return False
+    ratings[idx] = rating
+    return True
 
   def expandName(self, n):
     n = fixCardName(n)
@@ -31,164 +79,310 @@ class TierList(object):
 
     return (n,)
 
+  def option(self, key, conv = str, default = None):
+    value = self.cfg.options.get(key)
+    if value is None:
+      if default is None:
+        raise ValueError('TierList {0}: Missing option {1}'.format(self.name, key))
+      return default
+    try:
+      return conv(value)
+    except ValueError:
+      raise ValueError('TierList {0}: Bad value for option {1}: {2}'.format(self.name, key, value))
+
+  # Yields (name, rating) for each entry in the open file. Names are expanded by entries().
+  def parse(self, fp):
+    raise NotImplementedError('Base TierList class does not implement parse.')
+
+  def entries(self):
+    expandName = self.expandName
+    with open(self.cfg.filename, 'r', encoding = 'utf-8') as fp:
+      for name, rating in self.parse(fp):
+        for currname in expandName(name):
+          yield (currname, rating)
+
+  def fileStamp(self):
+    try:
+      st = os.stat(self.cfg.filename)
+    except OSError:
+      return None
+    return (st.st_mtime_ns, st.st_size)
+
+  def stale(self):
+    return self.stamp is None or self.stamp != self.fileStamp()
+
+  # Seconds since the epoch, None for a list not loaded from a file yet.
+  def updated(self):
+    if self.date is not None:
+      return self.date
+    return self.stamp[0] / 1e9 if self.stamp is not None else None
+
+  # Parses into a fresh array and only swaps it in, with the file stamp, once the whole file
+  # parsed. A failed parse (a half written download, a bad row) keeps the previous ratings and
+  # leaves the list stale, so it is tried again on the next refresh.
   def load(self):
-    raise NotImplementedError('Base TierList class does not implement load.')
+    stamp = self.fileStamp()
+    ratings = array.array('d')
+    count = 0
+    storeRating = self._storeRating
+    for name, rating in self.entries():
+      if storeRating(ratings, name, rating):
+        count += 1
+    self.ratings, self.count = ratings, count
+    self.stamp = stamp
+
+  # Loads the list again and returns the ids of the names whose rating changed.
+  def reload(self):
+    old = self.ratings
+    self.load()
+    new = self.ratings
+    oldlen, newlen = len(old), len(new)
+    changed = []
+    for idx in range(max(oldlen, newlen)):
+      orating = old[idx] if idx < oldlen else _NORATING
+      nrating = new[idx] if idx < newlen else _NORATING
+      if orating != nrating and not (math.isnan(orating) and math.isnan(nrating)):
+        changed.append(idx)
+    return changed
 
   def get(self, name, default = None):
-    return self.tl.get(name, default)
+    idx = self.names.get(name)
+    if idx is None or idx >= len(self.ratings):
+      return default
+    rating = self.ratings[idx]
+    return default if math.isnan(rating) else rating
 
   def __len__(self):
-    return len(self.tl)
+    return self.count
 
   def __getitem__(self, key):
-    return self.tl[key]
+    rating = self.get(key)
+    if rating is None:
+      raise KeyError(key)
+    return rating
 
   def __contains__(self, key):
-    return key in self.tl
+    return self.get(key) is not None
 
 
 class TierListSimple(TierList):
-  def load(self):
-    fn = self.cfg.filename
-    nameidx = self.cfg.namecolumn - 1
-    ratingidx = self.cfg.ratingcolumn - 1
-    tierdata = {}
-    self.tl = tierdata
-    with open(fn, 'r', encoding = 'utf-8') as fp:
-      csvr = csv.reader(fp)
-      for row in csvr:
-        rowlen = len(row)
-        if rowlen < 1 or row[0] == '' or row[0] == 'Card':
-          continue
-        if rowlen <= nameidx or rowlen <= ratingidx:
-          continue
-        name = row[nameidx].strip()
-        rating = row[ratingidx].strip()
-        if not name or not rating:
-          continue
-        rating = float(rating)
-        names = self.expandName(name)
-        for currname in names:
-          tierdata[currname] = TierCard(currname, rating)
+  delimiter = ','
+
+  def __init__(self, tlcfg, names = None):
+    super().__init__(tlcfg, names)
+    self.nameidx = self.option('namecolumn', int) - 1
+    self.ratingidx = self.option('ratingcolumn', int) - 1
+    self.delimiter = self.option('delimiter', default = self.delimiter)
+
+  def parse(self, fp):
+    nameidx = self.nameidx
+    ratingidx = self.ratingidx
+    for row in csv.reader(fp, delimiter = self.delimiter):
+      rowlen = len(row)
+      if rowlen < 1 or row[0] == '' or row[0] == 'Card':
+        continue
+      if rowlen <= nameidx or rowlen <= ratingidx:
+        continue
+      name = row[nameidx].strip()
+      rating = row[ratingidx].strip()
+      if not name or not rating:
+        continue
+      yield (name, float(rating))
+
+
+class TierListTSV(TierListSimple):
+  delimiter = '\t'
+
+
+# Either an object mapping names to ratings or a list of objects with name and rating keys.
+class TierListJSON(TierList):
+  def __init__(self, tlcfg, names = None):
+    super().__init__(tlcfg, names)
+    self.namekey = self.option('namekey', default = 'name')
+    self.ratingkey = self.option('ratingkey', default = 'rating')
+
+  def parse(self, fp):
+    data = json.load(fp)
+    if isinstance(data, dict):
+      items = data.items()
+    elif isinstance(data, list):
+      namekey, ratingkey = self.namekey, self.ratingkey
+      items = ((entry.get(namekey), entry.get(ratingkey)) for entry in data if isinstance(entry, dict))
+    else:
+      raise ValueError('TierList {0}: Expected a JSON object or list'.format(self.name))
+    for name, rating in items:
+      if not isinstance(name, str) or rating is None or rating == '':
+        continue
+      name = name.strip()
+      if name:
+        yield (name, float(rating))
 
 
 class TierListSunyveil(TierList):
-  def __init__(self, tlcfg):
-    self.rc = tuple(float(v) for v in tlcfg.ratingconversion.split(None))
+  def __init__(self, tlcfg, names = None):
+    super().__init__(tlcfg, names)
+    self.rc = tuple(float(v) for v in self.option('ratingconversion').split(None))
     if len(self.rc) != 6:
       raise ValueError('TierListSunyveil: Invalid number of values in rating conversion')
-    super().__init__(tlcfg)
 
-  def load(self):
-    scfg = self.cfg
-    fn = scfg.filename
+  def parse(self, fp):
     rc = self.rc
-    tierdata = {}
-    self.tl = tierdata
-    with open(fn, 'r', encoding = 'utf-8') as fp:
-      csvr = csv.reader(fp)
-      for row in csvr:
-        row = row[:6]
-        if row == ['S', 'A', 'B', 'C', 'D', 'E']:
-          continue
-        for idx in range(6):
-          name = row[idx]
-          name = name.strip()
-          if name == '':
-            continue
-          rating = rc[idx]
-          names = self.expandName(name)
-          for currname in names:
-            tierdata[currname] = TierCard(currname, rating)
+    for row in csv.reader(fp):
+      row = row[:6]
+      if row == ['S', 'A', 'B', 'C', 'D', 'E']:
+        continue
+      for idx, name in enumerate(row):
+        name = name.strip()
+        if name != '':
+          yield (name, rc[idx])
 
 
 class TierListKonan(TierList):
-  def __init__(self, tlcfg):
-    self.rc = dict((rk, float(rv)) for rk,rv in (v.split('=', 1) for v in tlcfg.ratingconversion.split(None)))
-    super().__init__(tlcfg)
+  def __init__(self, tlcfg, names = None):
+    super().__init__(tlcfg, names)
+    self.rc = dict((rk, float(rv)) for rk,rv in (v.split('=', 1) for v in self.option('ratingconversion').split(None)))
 
-  def load(self):
-    scfg = self.cfg
-    fn = scfg.filename
+  def parse(self, fp):
     rc = self.rc
-    tierdata = {}
-    self.tl = tierdata
     currtier = None
-    with open(fn, 'r', encoding = 'utf-8') as fp:
-      csvr = csv.reader(fp)
-      for row in csvr:
-        if len(row) != 1:
-          continue
-        rowval = row[0].strip()
-        if not rowval:
-          continue
-        if len(rowval) < 3:
-          currtier = rc.get(rowval)
-          if currtier is None:
-            print('!! Unknown tier value:', rowval)
-          continue
+    for row in csv.reader(fp):
+      if len(row) != 1:
+        continue
+      rowval = row[0].strip()
+      if not rowval:
+        continue
+      if len(rowval) < 3:
+        currtier = rc.get(rowval)
+        if currtier is None:
+          print('!! Unknown tier value:', rowval)
+        continue
+      if currtier is None:
+        print('!! Got entry with no tier value set. Bailing!')
+        return
+      nextrowval = None
+      if rowval[-1] in '-+':
+        nextrowval = rowval[-2:]
+        rowval = rowval[:-2].strip()
+      yield (rowval, currtier)
+      if nextrowval is not None:
+        currtier = rc.get(nextrowval)
         if currtier is None:
-          print('!! Got entry with no tier value set. Bailing!')
-          return None
-        nextrowval = None
-        if rowval[-1] in '-+':
-          nextrowval = rowval[-2:]
-          rowval = rowval[:-2].strip()
-        name = rowval
-        names = self.expandName(name)
-        for currname in names:
-          tierdata[currname] = TierCard(currname, currtier)
-        if nextrowval is not None:
-          currtier = rc.get(nextrowval)
-          if currtier is None:
-            print('!! Unknown tier value:', rowval)
-          nextrowval = None
+          print('!! Unknown tier value:', rowval)
 
 
+# Format name to TierList subclass. The class gets the list's config section as tlcfg.options
+# and implements parse(fp).
+TIERLISTFORMATS = {}
 
+def registerTierListFormat(name, tlclass):
+  TIERLISTFORMATS[name.lower()] = tlclass
+
+registerTierListFormat('simple', TierListSimple)
+registerTierListFormat('tsv', TierListTSV)
+registerTierListFormat('json', TierListJSON)
+registerTierListFormat('sunyveil', TierListSunyveil)
+registerTierListFormat('konan', TierListKonan)
+
+
+# Lists are in order of preference: first mode uses the first list rating a card. A decay below 1
+# weights each list by another factor of decay per decaydays days it is older than the newest list.
 class TierLists(object):
-  __tlc = {
-      'simple': TierListSimple,
-      'sunyveil': TierListSunyveil,
-      'konan': TierListKonan,
-    }
-  def __init__(self):
+  def __init__(self, mode = 'average', decay = 1.0, trim = 0.25, normalize = False, decaydays = 30.0):
     self.tls = collections.OrderedDict()
+    self.names = {}
+    self.setAggregation(mode = mode, decay = decay, trim = trim, normalize = normalize, decaydays = decaydays)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_aggregated'] = None
+    return state
+
+  def setAggregation(self, mode = 'average', decay = 1.0, trim = 0.25, normalize = False, decaydays = 30.0):
+    if mode not in AGGREGATEMODES:
+      raise ValueError('TierLists: Unknown mode {0}'.format(mode))
+    self.mode = mode
+    self.decay = decay
+    self.decaydays = decaydays
+    self.trim = trim
+    self.normalize = normalize
+    self._aggregated = None
 
   def register(self, tlcfg):
     tltyp = tlcfg.format
     name = tlcfg.name
     if tltyp is None:
       raise ValueError('TierLists: Format not set for {0}'.format(name))
-    tlclass = self.__tlc.get(tltyp.lower())
+    tlclass = TIERLISTFORMATS.get(tltyp.lower())
     if tlclass is None:
       raise ValueError('TierLists: Unknown tierlist type {0} for {1}'.format(tltyp, name))
-    self.tls[name] = tlclass(tlcfg)
+    self.tls[name] = tlclass(tlcfg, self.names)
+    self._aggregated = None
 
   def load(self):
     for tl in self.tls.values():
       tl.load()
-
-  def get(self, name, avg = True):
-    if not avg:
-      for tl in self.tls.values():
-        tc = tl.get(name)
-        if tc is not None:
-          return (tc.rating, [tl])
+    self._aggregated = None
+
+  def stale(self):
+    return [tl for tl in self.tls.values() if tl.stale()]
+
+  # Reloads the lists whose files changed since they were loaded and returns the names whose
+  # aggregated rating may have changed.
+  def refresh(self):
+    changed = set()
+    stale = self.stale()
+    for tl in stale:
+      changed.update(tl.reload())
+    if stale:
+      self._aggregated = None
+    if (self.normalize or self.decay != 1.0) and stale:
+      # The scale of every list depends on all the ratings, the ages on the newest list.
+      return set(self.names)
+    if not changed:
+      return set()
+    idnames = [None] * len(self.names)
+    for name, idx in self.names.items():
+      idnames[idx] = name
+    return set(idnames[idx] for idx in changed)
+
+  # Ratings and sources for every name id, computed in one pass over the lists' rating arrays.
+  def aggregated(self):
+    if self._aggregated is None:
+      tls = list(self.tls.values())
+      columns = [tl.ratings for tl in tls]
+      if self.normalize:
+        columns = normalizeColumns(columns)
+      weights = self.weights(tls)
+      ratings, sourceids = aggregateRatings(columns, weights, mode = self.mode, trim = self.trim)
+      shared = {}
+      sources = [None if ids is None else shared.get(ids) or shared.setdefault(ids, [tls[idx] for idx in ids])
+        for ids in sourceids]
+      self._aggregated = (ratings, sources)
+    return self._aggregated
+
+  # Weights of tls with the recency decay applied. Lists without an update time count as newest.
+  def weights(self, tls):
+    if self.decay == 1.0:
+      return [tl.weight for tl in tls]
+    updated = [tl.updated() for tl in tls]
+    newest = max((stamp for stamp in updated if stamp is not None), default = None)
+    period = self.decaydays * 86400.0
+    return [tl.weight * (self.decay ** (max(0.0, newest - stamp) / period) if stamp is not None else 1.0)
+      for tl,stamp in zip(tls, updated)]
+
+  def get(self, name):
+    idx = self.names.get(name)
+    if idx is None:
       return None
-    matched = []
-    for tl in self.tls.values():
-      tc = tl.get(name)
-      if tc is not None:
-        matched.append((tc, tl))
-    if not matched:
+    ratings, sources = self.aggregated()
+    if idx >= len(ratings) or sources[idx] is None:
       return None
-    avgresult = sum(tc.rating for tc,_ in matched) / len(matched)
-    sources = list(tl for _,tl in matched)
-    return (avgresult, sources)
+    return (ratings[idx], sources[idx])
 
 
 class RatedCard(Card):
+  __slots__ = ('rating', 'sources')
+
   @classmethod
   def fromCard(cls, card, rating, sources):
     return cls(card.name, card.cost, card.creq, card.rarity, card.setid, card.cardid, card.ctype, card.text, card.dam, card.life,
@@ -196,26 +390,117 @@ class RatedCard(Card):
 
   def __init__(self, *args, rating = None, sources = None, **kwargs):
     super().__init__(*args, **kwargs)
+    self.setRating(rating, sources)
+
+  def setRating(self, rating, sources):
     if rating is None or not sources:
       rating = -10.0
-      sources = []
+      sources = ()
     self.rating = rating
     self.sources = sources
 
 
 class RatedCards(object):
-  def __init__(self, cards, tls, avg = True):
+  def __init__(self, cards, tls):
     self.cards = {}
     self.tls = tls
+    self.listeners = []
     for card in cards.values():
       name = card.name
-      tresult = tls.get(name, avg = avg)
+      tresult = tls.get(name)
       if tresult:
         rating, sources = tresult
       else:
         rating = None
         sources = None
-      self.cards[name] = RatedCard.fromCard(card, rating, sources)
+      if isinstance(card, RatedCard):
+        card.setRating(rating, sources)
+      else:
+        card = RatedCard.fromCard(card, rating, sources)
+      self.cards[name] = card
+    self._nameindex = None
+    self._idindex = None
+    self._setindex = None
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_nameindex'] = None
+    state['_idindex'] = None
+    state['_setindex'] = None
+    state['listeners'] = []
+    return state
+
+  # callback(names) is called with the set of card names whose rating or sources changed.
+  def subscribe(self, callback):
+    self.listeners.append(callback)
+
+  def unsubscribe(self, callback):
+    self.listeners.remove(callback)
+
+  def notify(self, names):
+    for callback in tuple(self.listeners):
+      callback(names)
+
+  # Reloads only the tier lists whose files changed and rerates the cards they touch. Returns
+  # the names of the cards whose rating or sources changed.
+  def refresh(self):
+    return self.rerate(self.tls.refresh())
+
+  # Rates the named cards (all by default) again, e.g. after TierLists.setAggregation.
+  def rerate(self, names = None):
+    tls = self.tls
+    cards = self.cards
+    changed = set()
+    for name in (cards.keys() if names is None else names):
+      card = cards.get(name)
+      if card is None:
+        continue
+      oldrating, oldsources = card.rating, card.sources
+      tresult = tls.get(name)
+      if tresult:
+        card.setRating(*tresult)
+      else:
+        card.setRating(None, None)
+      if card.rating != oldrating or [tl.name for tl in card.sources] != [tl.name for tl in oldsources]:
+        changed.add(name)
+    if changed:
+      self.notify(changed)
+    return changed
+
+  @property
+  def nameindex(self):
+    if self._nameindex is None:
+      self._nameindex = NameIndex(self.cards.keys())
+    return self._nameindex
+
+  # (setid, cardid) to name, both strings as in cardids.csv and deck exports.
+  @property
+  def idindex(self):
+    if self._idindex is None:
+      self._idindex = dict(((card.setid, card.cardid), name) for name,card in self.cards.items())
+    return self._idindex
+
+  # setid to the names of the cards in the set, in card database order.
+  @property
+  def setindex(self):
+    if self._setindex is None:
+      setindex = collections.defaultdict(list)
+      for name, card in self.cards.items():
+        setindex[card.setid].append(name)
+      self._setindex = dict(setindex)
+    return self._setindex
+
+  def getById(self, setid, cardid, default = None):
+    name = self.idindex.get((setid, cardid))
+    return default if name is None else self.cards[name]
+
+  def sets(self):
+    return sorted(self.setindex, key = lambda setid: (len(setid), setid))
+
+  # The cards of a set, best rated first. Unrated cards come last.
+  def inSet(self, setid):
+    cards = self.cards
+    return sorted((cards[name] for name in self.setindex.get(setid, ())), key = lambda card: card.rating, reverse = True)
 
   def get(self, name, default = None):
     return self.cards.get(name, default)
@@ -239,15 +524,13 @@ class RatedCards(object):
     return key in self.cards
 
 
-class TierCard(object):
-  def __init__(self, name, rating):
-    self.name = name
-    self.rating = rating
-
-
 def loadTierLists():
-  tls = TierLists()
-  for tlcfg in CFG.tierlists.lists:
+  for modname in CFG.tierlists.plugins:
+    importlib.import_module(modname)
+  tlscfg = CFG.tierlists
+  tls = TierLists(mode = tlscfg.mode, decay = tlscfg.decay, trim = tlscfg.trim, normalize = tlscfg.normalize,
+    decaydays = tlscfg.decaydays)
+  for tlcfg in tlscfg.lists:
     tls.register(tlcfg)
   tls.load()
   return tls
@@ -0,0 +1,142 @@
+__all__ = ['stage', 'startTimings', 'finishTimings']
+
+import json
+import sys
+import threading
+import time
+
+
+# Totals per stage path while timings are on, None otherwise. stage() does nothing when off.
+_STAGES = None
+_EVENTS = []
+# Open stages per thread, so stages in the interactive shell's worker threads do not nest into each other.
+_LOCAL = threading.local()
+_TRACEMALLOC = None
+_STARTED = 0.0
+
+
+class _NoStage(object):
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+_NOSTAGE = _NoStage()
+
+
+# Wall and CPU time, the net change in allocated memory blocks and, with tracemalloc, the net and
+# peak traced bytes.
+class _Stage(object):
+  __slots__ = ('path', 'wall', 'cpu', 'blocks', 'traced', 'peak')
+
+  def __init__(self, name):
+    stack = _stack()
+    self.path = stack[-1].path + (name,) if stack else (name,)
+
+  def __enter__(self):
+    stack = _stack()
+    self.peak = 0
+    if _TRACEMALLOC is not None:
+      current, peak = _TRACEMALLOC.get_traced_memory()
+      # reset_peak() below loses the parent's peak so far, keep it with the parent.
+      if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+      self.traced = current
+      _TRACEMALLOC.reset_peak()
+    stack.append(self)
+    # Registered on entry so the summary lists stages before the stages they contain.
+    if _STAGES is not None and self.path not in _STAGES:
+      _STAGES[self.path] = [0, 0.0, 0.0, 0, 0, 0]
+    self.blocks = sys.getallocatedblocks()
+    self.cpu = time.process_time()
+    self.wall = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    stack = _stack()
+    wall = time.perf_counter() - self.wall
+    cpu = time.process_time() - self.cpu
+    blocks = sys.getallocatedblocks() - self.blocks
+    traced = peak = 0
+    if _TRACEMALLOC is not None:
+      current, peak = _TRACEMALLOC.get_traced_memory()
+      peak = max(peak, self.peak)
+      traced = current - self.traced
+      peak -= self.traced
+    stack.pop()
+    if stack and _TRACEMALLOC is not None:
+      parent = stack[-1]
+      parent.peak = max(parent.peak, peak + self.traced)
+    totals = None if _STAGES is None else _STAGES.get(self.path)
+    if totals is None:
+      return False
+    totals[0] += 1
+    totals[1] += wall
+    totals[2] += cpu
+    totals[3] += blocks
+    totals[4] += traced
+    totals[5] = max(totals[5], peak)
+    _EVENTS.append({'name': self.path[-1], 'ph': 'X', 'pid': 0, 'tid': threading.get_ident(),
+      'ts': round((self.wall - _STARTED) * 1e6, 1), 'dur': round(wall * 1e6, 1),
+      'args': {'cpu_ms': round(cpu * 1e3, 3), 'blocks': blocks, 'traced_bytes': traced, 'peak_bytes': peak}})
+    return False
+
+
+def _stack():
+  stack = getattr(_LOCAL, 'stack', None)
+  if stack is None:
+    stack = _LOCAL.stack = []
+  return stack
+
+
+# Usage: with stage('loadCards'): ... Stages nest, the same name under different parents is kept apart.
+def stage(name):
+  if _STAGES is None:
+    return _NOSTAGE
+  return _Stage(name)
+
+
+def startTimings(memory = False):
+  global _STAGES, _TRACEMALLOC, _STARTED
+  _STAGES = {}
+  del _EVENTS[:]
+  if memory:
+    import tracemalloc
+    tracemalloc.start()
+    _TRACEMALLOC = tracemalloc
+  _STARTED = time.perf_counter()
+
+
+# Stops recording. With dest "-" a summary table goes to stderr, otherwise a JSON trace is written
+# to dest: Chrome trace events (chrome://tracing, Perfetto) plus the per stage totals.
+def finishTimings(dest = '-'):
+  global _STAGES, _TRACEMALLOC
+  stages, _STAGES = _STAGES, None
+  if stages is None:
+    return
+  memory = _TRACEMALLOC is not None
+  if memory:
+    _TRACEMALLOC.stop()
+    _TRACEMALLOC = None
+  rows = [{'stage': '/'.join(path), 'calls': calls, 'wall_ms': wall * 1e3, 'cpu_ms': cpu * 1e3,
+      'blocks': blocks, 'traced_bytes': traced, 'peak_bytes': peak}
+    for path,(calls, wall, cpu, blocks, traced, peak) in stages.items()]
+  if dest != '-':
+    with open(dest, 'w', encoding = 'utf-8') as fp:
+      json.dump({'traceEvents': _EVENTS, 'displayTimeUnit': 'ms', 'stages': rows}, fp)
+    print('** Timings written to {0}'.format(dest), file = sys.stderr)
+    return
+  out = sys.stderr
+  header = '{0:<32} {1:>6} {2:>10} {3:>10} {4:>9}'.format('Stage', 'Calls', 'Wall ms', 'CPU ms', 'Blocks')
+  if memory:
+    header += ' {0:>10} {1:>10}'.format('Net KiB', 'Peak KiB')
+  print('\n' + header, file = out)
+  for path, row in zip(stages, rows):
+    line = '{0:<32} {1:>6} {2:>10.2f} {3:>10.2f} {4:>+9}'.format(
+      '  ' * (len(path) - 1) + path[-1], row['calls'], row['wall_ms'], row['cpu_ms'], row['blocks'])
+    if memory:
+      line += ' {0:>+10.1f} {1:>10.1f}'.format(row['traced_bytes'] / 1024, row['peak_bytes'] / 1024)
+    print(line, file = out)
@@ -1,6 +1,8 @@
-__all__ = ['FACTIONS', 'CTOFACTION', 'CRESTS', 'COLORCOMBOS', 'TYPES', 'parseTime', 'fixCardName']
+__all__ = ['FACTIONS', 'CTOFACTION', 'CRESTS', 'COLORCOMBOS', 'TYPES', 'COLORBITS', 'MASKOTHER', 'MASKNEUTRAL', 'NUMCOLORMASKS', 'colorMask', 'parseTime', 'fixCardName', 'atomicWrite']
 
+import os
 import string
+import threading
 
 
 FACTIONS = {
@@ -41,6 +43,23 @@ COLORCOMBOS = ['T', 'J', 'P', 'S', 'F', 'TJ', 'TP', 'TS', 'TF', 'JP', 'JS', 'JF'
 
 TYPES = set(('Unit', 'Attachment', 'Spell', 'Fast Spell', 'Power', 'Sigil', 'Other'))
 
+# Influence colors as bits. The five real colors fit in NUMCOLORMASKS, neutral and anything
+# unrecognized get bits of their own above that.
+COLORBITS = { 'F': 1, 'T': 2, 'J': 4, 'P': 8, 'S': 16, 'N': 64 }
+MASKOTHER = 32
+MASKNEUTRAL = 64
+NUMCOLORMASKS = 32
+
+_colormasks = {}
+def colorMask(creq):
+  mask = _colormasks.get(creq)
+  if mask is None:
+    mask = 0
+    for c in creq.upper():
+      mask |= COLORBITS.get(c, MASKOTHER)
+    _colormasks[creq] = mask
+  return mask
+
 
 _timeabbrevs = { 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800 }
 def parseTime(s):
@@ -62,3 +81,20 @@ def parseTime(s):
 
 def fixCardName(s):
   return s.replace("’", "'")
+
+
+# Writes chunks to a temporary file next to fn and renames it over fn, so readers never see a partial file.
+def atomicWrite(fn, chunks, mode = 'wb', **kwargs):
+  tmpfn = os.path.join(os.path.dirname(fn), '.{0}.{1}.{2}.tmp'.format(
+    os.path.basename(fn), os.getpid(), threading.get_ident()))
+  try:
+    with open(tmpfn, mode, **kwargs) as fp:
+      for chunk in chunks:
+        fp.write(chunk)
+    os.replace(tmpfn, fn)
+  except BaseException:
+    try:
+      os.unlink(tmpfn)
+    except OSError:
+      pass
+    raise
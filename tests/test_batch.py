@@ -0,0 +1,33 @@
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from dhelper.bench import makeFixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# quarry-batch's default CSV output, from the command line like a user runs it.
+class QuarryBatchCSVTest(unittest.TestCase):
+  def test_csv_rows_have_curve(self):
+    with tempfile.TemporaryDirectory(prefix = 'dhelper-test-') as dirname:
+      makeFixtures(dirname, 500, (45, 200))
+      env = dict(os.environ, PYTHONPATH = ROOT)
+      proc = subprocess.run([sys.executable, '-m', 'dhelper', 'qb', 'pool45.lst', 'pool200.lst', '-m', '1', '-j', '2',
+        '-u', '0', '-p', '0', '-o', 'out.csv'], cwd = dirname, env = env, stdout = subprocess.PIPE,
+        stderr = subprocess.PIPE, universal_newlines = True)
+      self.assertEqual(proc.returncode, 0, proc.stderr)
+      with open(os.path.join(dirname, 'out.csv'), encoding = 'utf-8', newline = '') as fp:
+        rows = list(csv.DictReader(fp))
+    self.assertIn('curve', rows[0])
+    self.assertEqual(set(row['pool'] for row in rows), {'pool45.lst', 'pool200.lst'})
+    for row in rows:
+      if int(row['units']) + int(row['spells']) + int(row['fastspells']) + int(row['attachments']):
+        self.assertRegex(row['curve'], r'^\d+=\d+( \d+=\d+)*$')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from dhelper.names import NameIndex, editDistance
+
+
+class FuzzyTest(unittest.TestCase):
+  # Every word has a swapped pair of letters: three transpositions, each losing NGRAM + 1 n-grams.
+  def test_transpositions(self):
+    index = NameIndex(['Eternal Warden of the North', 'Eternal Warden', 'Northern Rider'])
+    query = 'eternla wraden of teh north'
+    self.assertEqual(editDistance(query, 'eternal warden of the north', 3), 3)
+    self.assertEqual(index.fuzzy(query), [(3, 'Eternal Warden of the North')])
+
+  def test_short_queries(self):
+    index = NameIndex(['Torch', 'Vara, Fortune Collector', 'Eko', 'Vara'])
+    self.assertEqual(index.fuzzy('Tocrh')[0], (1, 'Torch'))
+    self.assertEqual(index.fuzzy('Vraa')[0], (1, 'Vara'))
+    self.assertEqual(index.fuzzy('Eok')[0], (1, 'Eko'))
+
+
+if __name__ == '__main__':
+  unittest.main()
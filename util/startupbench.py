@@ -0,0 +1,85 @@
+# Checks the startup budget documented in README.md.
+#
+# Run from the repository root: python util/startupbench.py [--budget MS] [--runs N] [--datadir DIR]
+# With --datadir, dumptierlist is also run in DIR (which must have the CSV files and a warm snapshot)
+# and checked for modules it should not need.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Median import time of dhelper.main, in milliseconds.
+BUDGET = 50.0
+
+# Modules only specific modes need. Importing dhelper.main or running dumptierlist must not load them.
+LAZYMODULES = ('urllib.request', 'http.client', 'http.server', 'concurrent.futures',
+  'multiprocessing', 'readline', 'shlex', 'colorama', 'dhelper.styling', 'dhelper.fetch',
+  'dhelper.server', 'dhelper.batch', 'asyncio', 'dhelper.shell')
+
+_LOADEDSCRIPT = '''
+import sys
+{setup}
+print(' '.join(sorted(sys.modules)))
+'''
+
+_DUMPSETUP = '''
+import contextlib, io
+sys.argv = ['dhelper', 'dumptierlist']
+from dhelper.main import main
+with contextlib.redirect_stdout(io.StringIO()):
+  main()
+'''
+
+
+def importTime(root):
+  proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import dhelper.main'],
+    cwd = root, stderr = subprocess.PIPE, stdout = subprocess.DEVNULL, universal_newlines = True, check = True)
+  for line in proc.stderr.splitlines():
+    parts = line.split('|')
+    if len(parts) == 3 and parts[2].strip() == 'dhelper.main':
+      return int(parts[1]) / 1000.0
+  raise RuntimeError('dhelper.main missing from -X importtime output')
+
+
+def loadedModules(root, setup, cwd = None):
+  env = dict(os.environ, PYTHONPATH = root)
+  proc = subprocess.run([sys.executable, '-c', _LOADEDSCRIPT.format(setup = setup)],
+    cwd = cwd or root, env = env, stdout = subprocess.PIPE, universal_newlines = True, check = True)
+  return set(proc.stdout.split())
+
+
+def checkLazy(label, modules):
+  eager = [m for m in LAZYMODULES if m in modules]
+  if eager:
+    print('FAIL {0}: loaded {1}'.format(label, ', '.join(eager)))
+    return False
+  print('ok   {0}: no mode specific modules loaded'.format(label))
+  return True
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--budget', type = float, default = BUDGET)
+  parser.add_argument('--runs', type = int, default = 10)
+  parser.add_argument('--datadir', type = str, default = None)
+  args = parser.parse_args()
+  root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  ok = True
+
+  times = [importTime(root) for _ in range(args.runs)]
+  median = statistics.median(times)
+  within = median <= args.budget
+  ok = ok and within
+  print('{0} import dhelper.main: median {1:.1f} ms, min {2:.1f} ms over {3} runs (budget {4:.1f} ms)'.format(
+    'ok  ' if within else 'FAIL', median, min(times), args.runs, args.budget))
+
+  ok = checkLazy('import dhelper.main', loadedModules(root, 'import dhelper.main')) and ok
+  if args.datadir:
+    ok = checkLazy('dumptierlist', loadedModules(root, _DUMPSETUP, cwd = args.datadir)) and ok
+  sys.exit(0 if ok else 1)
+
+
+main()